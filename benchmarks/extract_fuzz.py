@@ -0,0 +1,157 @@
+import argparse
+import json
+import random
+import re
+import statistics
+import time
+
+from utils.plantuml_extract import PlantUMLExtractor, extract_plantuml_code, extract_all_plantuml_code
+
+WORDS = ["схема", "сервис", "запрос", "ответ", "класс", "модуль", "email@example.com", "a@b", "`code`", "``", "@", "```"]
+DIAGRAM_LINES = ["A -> B: вызов", "class Заказ {", "  +id: int", "}", "note left: текст", "B --> A", "' комментарий",
+                 "participant \"Сервис\" as S", "if (ok?) then (да)", "endif", "skinparam monochrome true"]
+DIAGRAM_TYPES = ["uml", "mindmap", "json", "gantt"]
+FENCE_LANGS = ["plantuml", "puml", "uml", "PlantUML"]
+SIZES_KB = (100, 300, 800)
+
+
+def legacy_extract(text):
+    # Прежняя реализация: две findall по всему тексту.
+    code_blocks = re.findall(r"``````", text, re.DOTALL | re.IGNORECASE)
+    if code_blocks:
+        return code_blocks[0].strip()
+    matches = re.findall(r"(@startuml.*?@enduml)", text, re.DOTALL | re.IGNORECASE)
+    if matches:
+        return matches[0].strip()
+    return None
+
+
+def random_prose(rng, lines):
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 10))).replace("```", "`` `") for _ in range(lines)]
+
+
+def random_diagram(rng):
+    kind = rng.choice(DIAGRAM_TYPES)
+    body = [rng.choice(DIAGRAM_LINES) for _ in range(rng.randint(0, 8))]
+    return "\n".join([f"@start{kind}"] + body + [f"@end{kind}"])
+
+
+def random_response(rng):
+    parts = []
+    expected = []
+    for _ in range(rng.randint(0, 4)):
+        parts += random_prose(rng, rng.randint(0, 5))
+        diagram = random_diagram(rng)
+        style = rng.choice(["fence", "bare", "generic", "fence_no_close"])
+        if style == "fence":
+            parts += [f"```{rng.choice(FENCE_LANGS)}", diagram, "```"]
+        elif style == "fence_no_close":
+            # Незакрытый блок допустим только последним: дальше ответ обрывается.
+            parts += [f"```{rng.choice(FENCE_LANGS)}", diagram]
+            expected.append(diagram)
+            break
+        elif style == "generic":
+            parts += ["```", diagram, "```"]
+        else:
+            parts.append(diagram)
+        expected.append(diagram)
+    else:
+        parts += random_prose(rng, rng.randint(0, 5))
+    newline = "\r\n" if rng.random() < 0.2 else "\n"
+    return newline.join(parts), expected
+
+
+def feed_in_chunks(text, rng):
+    extractor = PlantUMLExtractor()
+    found = []
+    pos = 0
+    while pos < len(text):
+        step = rng.randint(1, 64)
+        found += extractor.feed(text[pos:pos + step])
+        pos += step
+    return found + extractor.finish()
+
+
+def fuzz(cases, rng):
+    failures = []
+    for i in range(cases):
+        text, expected = random_response(rng)
+        checks = {
+            "all": extract_all_plantuml_code(text),
+            "first": extract_plantuml_code(text),
+            "chunked": feed_in_chunks(text, rng),
+        }
+        wanted = {"all": expected, "first": expected[0] if expected else None, "chunked": expected}
+        for name, got in checks.items():
+            if got != wanted[name]:
+                failures.append({"case": i, "check": name, "text": text[:500], "expected": wanted[name], "got": got})
+    return failures
+
+
+def large_response(size_kb, position, rng):
+    prose = []
+    total = 0
+    while total < size_kb * 1024:
+        line = " ".join(rng.choice(WORDS[:6]) for _ in range(12))
+        prose.append(line)
+        total += len(line.encode("utf-8")) + 1
+    diagram = ["```plantuml", "@startuml"] + [rng.choice(DIAGRAM_LINES) for _ in range(40)] + ["@enduml", "```"]
+    if position == "unterminated":
+        # Худший случай для ленивого .*?: много @startuml без @enduml.
+        lines = [line if i % 50 else "@startuml" for i, line in enumerate(prose)]
+    elif position == "start":
+        lines = diagram + prose
+    elif position == "end":
+        lines = prose + diagram
+    else:
+        lines = prose
+    return "\n".join(lines)
+
+
+def time_fn(fn, text, repeats):
+    values = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn(text)
+        values.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(values), 3)
+
+
+def benchmark(rng, repeats):
+    results = {}
+    for size_kb in SIZES_KB:
+        for position in ("start", "end", "none", "unterminated"):
+            text = large_response(size_kb, position, rng)
+            results[f"{size_kb}kb_{position}"] = {
+                "extract_ms": time_fn(extract_plantuml_code, text, repeats),
+                "extract_all_ms": time_fn(extract_all_plantuml_code, text, repeats),
+                "legacy_ms": time_fn(legacy_extract, text, repeats),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Фаззинг и скорость извлечения кода PlantUML из ответа LLM.")
+    parser.add_argument("--cases", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failures = fuzz(args.cases, rng)
+    result = {
+        "fuzz_cases": args.cases,
+        "fuzz_failures": len(failures),
+        "failure_examples": failures[:5],
+        "benchmark": benchmark(rng, args.repeats),
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=4))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=4)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+
+from utils.dirs import DB_PATH, PLANTUML_JAR_PATH
+from utils.plantuml_lint import lint_plantuml, blocking_issues
+from utils.plantuml_server import PlantUMLServer
+
+
+def load_corpus(db_path, limit):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT filename, code FROM schemes WHERE code IS NOT NULL ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    finally:
+        conn.close()
+    return rows
+
+
+def mutate(code, rng):
+    lines = code.split("\n")
+    kind = rng.choice(["drop_end", "drop_closer", "garbage", "drop_line"])
+    if kind == "drop_end":
+        lines = [line for line in lines if not line.strip().lower().startswith("@end")]
+    elif kind == "drop_closer":
+        closers = [i for i, line in enumerate(lines) if line.strip().lower() in ("}", "endif", "end", "endwhile", "end note", "end fork")]
+        if not closers:
+            return None
+        del lines[rng.choice(closers)]
+    elif kind == "garbage":
+        lines.insert(rng.randint(1, max(1, len(lines) - 1)), "-> ?? -> [")
+    else:
+        if len(lines) < 3:
+            return None
+        del lines[rng.randint(1, len(lines) - 2)]
+    return "\n".join(lines)
+
+
+def render_ok(server, code):
+    try:
+        server.render(code)
+        return True
+    except RuntimeError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Точность и скорость линтера PlantUML на сохранённых схемах.")
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--jar", default=str(PLANTUML_JAR_PATH))
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = []
+    for _, code in load_corpus(args.db, args.limit):
+        corpus.append((code, True))
+        broken = mutate(code, rng)
+        if broken is not None:
+            corpus.append((broken, False))
+
+    server = PlantUMLServer(args.jar) if os.path.isfile(args.jar) else None
+    lint_seconds = 0.0
+    counts = {"true_positive": 0, "true_negative": 0, "false_positive": 0, "false_negative": 0}
+    try:
+        for code, assumed_valid in corpus:
+            started = time.perf_counter()
+            # Как в render_plantuml: рендер останавливают только ошибки, не предупреждения.
+            issues = blocking_issues(lint_plantuml(code))
+            lint_seconds += time.perf_counter() - started
+            if server is None:
+                # Без plantuml.jar считаем исходные схемы корректными, а мутации — ошибочными.
+                valid = assumed_valid
+            else:
+                valid = render_ok(server, code)
+            if issues and not valid:
+                counts["true_positive"] += 1
+            elif issues and valid:
+                counts["false_positive"] += 1
+            elif not issues and valid:
+                counts["true_negative"] += 1
+            else:
+                counts["false_negative"] += 1
+    finally:
+        if server is not None:
+            server.close()
+
+    invalid = counts["true_positive"] + counts["false_negative"]
+    valid = counts["true_negative"] + counts["false_positive"]
+    result = {
+        "diagrams": len(corpus),
+        "ground_truth": "plantuml" if server is not None else "assumed",
+        **counts,
+        "false_negative_rate": counts["false_negative"] / invalid if invalid else 0.0,
+        "false_positive_rate": counts["false_positive"] / valid if valid else 0.0,
+        "lint_us_per_diagram": lint_seconds / len(corpus) * 1e6 if corpus else 0.0,
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=4))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from io import BytesIO
+
+from db.database import Database
+from utils.dirs import PLANTUML_JAR_PATH
+from utils.plantuml import OUTPUT_FORMATS, render_plantuml
+from utils.plantuml_server import shutdown_render_servers
+
+DIAGRAM_MESSAGES = (10, 100, 500)
+RENDER_REPEATS = 10
+DB_SCHEMES = 100
+DB_SCHEME_MESSAGES = 100
+PREVIEW_SIZE = (800, 600)
+
+
+def diagram(messages, seed=0):
+    lines = ["@startuml", f"title Схема из {messages} сообщений ({seed})"]
+    participants = max(2, messages // 10)
+    for i in range(participants):
+        lines.append(f'participant "Сервис {i}" as S{i}')
+    for i in range(messages):
+        lines.append(f"S{i % participants} -> S{(i * 7 + 1) % participants}: запрос {seed}-{i}")
+    lines.append("@enduml")
+    return "\n".join(lines)
+
+
+def median_ms(fn, repeats):
+    values = []
+    for i in range(repeats):
+        started = time.perf_counter()
+        fn(i)
+        values.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(values), 3)
+
+
+def bench_render(jar_path, sizes, repeats):
+    results = {}
+    for output_format in OUTPUT_FORMATS:
+        # Первый рендер запускает JVM формата, в замеры он не входит.
+        render_plantuml(diagram(1), jar_path, output_format=output_format)
+        for messages in sizes:
+            data = render_plantuml(diagram(messages), jar_path, output_format=output_format)
+            results[f"{output_format}_{messages}"] = {
+                "bytes": len(data),
+                "render_ms": median_ms(
+                    lambda i: render_plantuml(diagram(messages, i + 1), jar_path, output_format=output_format), repeats),
+            }
+    return results
+
+
+def bench_db(jar_path, tmp, schemes, messages):
+    results = {}
+    for output_format in OUTPUT_FORMATS:
+        path = os.path.join(tmp, f"{output_format}.db")
+        db = Database(path)
+        for i in range(schemes):
+            code = diagram(messages, i)
+            db.add_scheme(f"bench_{i}", code, None, render_plantuml(code, jar_path, output_format=output_format),
+                          image_format=output_format)
+        db.close()
+        size = sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+        results[output_format] = {"schemes": schemes, "db_bytes": size, "bytes_per_scheme": size // schemes}
+    return results
+
+
+def bench_preview(jar_path, sizes, width, height):
+    # Превью SVG растеризуется сразу в размер области, PNG декодируется целиком и уменьшается.
+    # png_rerender_ms — цена запасного пути через Java (второй рендер той же схемы в PNG),
+    # от которого отказались: он удваивал рендер и держал рядом второй пул JVM.
+    from PIL import Image
+
+    from utils.svg_raster import rasterize_svg, rasterizer_available
+
+    def decode_png(data):
+        with Image.open(BytesIO(data)) as img:
+            img.thumbnail((width, height), Image.Resampling.LANCZOS)
+
+    def rasterize(data):
+        with Image.open(BytesIO(rasterize_svg(data, width, height))) as img:
+            img.load()
+
+    results = {}
+    for messages in sizes:
+        code = diagram(messages)
+        png = render_plantuml(code, jar_path, output_format="png")
+        svg = render_plantuml(code, jar_path, output_format="svg")
+        row = {
+            "png_decode_ms": median_ms(lambda i: decode_png(png), 5),
+            "png_rerender_ms": median_ms(
+                lambda i: render_plantuml(diagram(messages, i + 1), jar_path, output_format="png"), 5),
+        }
+        if rasterizer_available():
+            row["svg_rasterize_ms"] = median_ms(lambda i: rasterize(svg), 5)
+        else:
+            row["svg_rasterize_ms"] = None
+            row["skipped"] = "нет зависимости: cairosvg"
+        results[str(messages)] = row
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение форматов PNG и SVG: время рендера, размер базы и превью.")
+    parser.add_argument("--jar", default=str(PLANTUML_JAR_PATH))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DIAGRAM_MESSAGES), help="сообщений в схеме")
+    parser.add_argument("--repeats", type=int, default=RENDER_REPEATS)
+    parser.add_argument("--db-schemes", type=int, default=DB_SCHEMES)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.jar):
+        print("plantuml.jar не найден, сравнение форматов пропущено.")
+        return
+    results = {}
+    try:
+        print("Рендер...")
+        results["render"] = bench_render(args.jar, args.sizes, args.repeats)
+        print("Размер базы...")
+        with tempfile.TemporaryDirectory() as tmp:
+            results["db"] = bench_db(args.jar, tmp, args.db_schemes, DB_SCHEME_MESSAGES)
+        print("Превью...")
+        try:
+            results["preview"] = bench_preview(args.jar, args.sizes, *PREVIEW_SIZE)
+        except ImportError as e:
+            results["preview"] = {"skipped": f"нет зависимости: {e.name}"}
+    finally:
+        shutdown_render_servers()
+
+    for messages in args.sizes:
+        png, svg = results["render"][f"png_{messages}"], results["render"][f"svg_{messages}"]
+        print(f"{messages:>5} сообщений: PNG {png['bytes']:>9} байт {png['render_ms']:>8.1f} мс, "
+              f"SVG {svg['bytes']:>9} байт {svg['render_ms']:>8.1f} мс")
+    print(json.dumps(results, ensure_ascii=False, indent=4))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    main()
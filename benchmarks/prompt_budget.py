@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from utils.llm import StubBackend, STUB_DIAGRAM
+from utils.pipeline import retry_messages
+from utils.plantuml_extract import PlantUMLExtractor
+from utils.prompt import assemble_prompt
+from utils.text_utils import estimate_tokens
+
+METHODOLOGY_TOKENS = (500, 2000, 8000, 32000)
+BUDGETS = (0, 4000, 2000, 1000)
+PROMPT = "Нарисуй схему процесса оформления заказа в интернет-магазине: корзина, оплата, доставка и уведомления."
+IMPROVE_1 = "Перепроверь код, сделай его ПОЛНОСТЬЮ корректным, чтобы PlantUML сгенерировал хорошую схему."
+IMPROVE_2 = "Всегда подписывай стрелки глаголами.\nИспользуй skinparam monochrome true."
+WORDS = ["участник", "сообщение", "стрелка", "граница", "контейнер", "компонент", "база", "очередь", "сервис", "шлюз"]
+RULES = ["Всегда подписывай стрелки глаголами.", "Никогда не используй цвета без легенды.",
+         "Обязательно указывай направление потока данных."]
+
+
+def methodology(tokens, rng):
+    sections = ["# Методология\nОпиши систему как набор контейнеров и связей между ними."]
+    while estimate_tokens("\n\n".join(sections)) < tokens:
+        index = len(sections)
+        lines = [f"## Раздел {index}"]
+        if index % 5 == 0:
+            lines.append(rng.choice(RULES))
+        for _ in range(rng.randint(3, 8)):
+            lines.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))) + ".")
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
+
+
+async def first_diagram_ms(backend, messages):
+    # Как в конвейере: читаем поток до первой полной диаграммы.
+    started = time.perf_counter()
+    extractor = PlantUMLExtractor()
+    stream = backend.astream(messages)
+    try:
+        async for chunk in stream:
+            if extractor.feed(chunk):
+                break
+    finally:
+        await stream.aclose()
+    return (time.perf_counter() - started) * 1000
+
+
+def measure_build(text, config, repeats):
+    values = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        build = assemble_prompt(PROMPT, text, config)
+        values.append((time.perf_counter() - started) * 1000)
+    return build, round(statistics.median(values), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Размер промта и задержка LLM при разных бюджетах токенов (stub-бэкенд).")
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(METHODOLOGY_TOKENS))
+    parser.add_argument("--budgets", nargs="+", type=int, default=list(BUDGETS))
+    parser.add_argument("--latency", type=float, default=0.2, help="время выдачи ответа stub-бэкендом, с")
+    parser.add_argument("--token-latency", type=float, default=0.00005, help="задержка на токен запроса, с")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    backend = StubBackend(latency=args.latency, token_latency=args.token_latency)
+    config = {"improve_prompt": True, "prompt_improve_1": IMPROVE_1, "prompt_improve_2": IMPROVE_2}
+    failed_code = STUB_DIAGRAM.format(title="Заказ")
+    results = {}
+    for size in args.sizes:
+        text = methodology(size, rng)
+        for budget in args.budgets:
+            build, build_ms = measure_build(text, {**config, "prompt_token_budget": budget}, args.repeats)
+            messages = retry_messages(build.text, None, None, None)
+            retry = retry_messages(build.text, failed_code, 3, "Syntax Error?")
+            results[f"{size}tok_budget{budget}"] = {
+                "original_tokens": build.original_tokens,
+                "prompt_tokens": build.tokens,
+                "retry_prompt_tokens": sum(estimate_tokens(m["content"]) for m in retry),
+                "deduplicated": build.deduplicated,
+                "dropped_sections": build.dropped_sections,
+                "truncated": build.truncated,
+                "build_ms": build_ms,
+                "first_diagram_ms": round(asyncio.run(first_diagram_ms(backend, messages)), 1),
+            }
+            row = results[f"{size}tok_budget{budget}"]
+            print(
+                f"методология ~{size:>6} ток., бюджет {budget or '—':>5}: промт {row['prompt_tokens']:>6} ток. "
+                f"(повтор {row['retry_prompt_tokens']:>6}), сборка {build_ms:>7.3f} мс, "
+                f"до диаграммы {row['first_diagram_ms']:>7.1f} мс"
+            )
+    print(json.dumps(results, ensure_ascii=False, indent=4))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    main()
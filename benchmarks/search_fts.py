@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from db.database import Database
+
+WORDS = [
+    "order", "payment", "customer", "invoice", "warehouse", "delivery", "user", "session", "token", "gateway",
+    "заказ", "оплата", "клиент", "склад", "доставка", "пользователь", "авторизация", "отчёт", "сервис", "очередь",
+]
+METHODOLOGIES = ["C4", "BPMN", "ER", "UML", None]
+QUERIES = ["order", "оплата", "custom", "склад доставка", "gateway token", "C4", "scheme_4999", "несуществующее"]
+
+
+def fill(db, count, rng):
+    rows = []
+    for i in range(count):
+        a, b, c = rng.sample(WORDS, 3)
+        code = f"@startuml\nclass {a.title()} {{\n  +{b}()\n}}\n{a.title()} --> {c.title()}\n@enduml"
+        rows.append((f"scheme_{i}", code, f"Нарисуй схему: {a}, {b} и {c}", rng.choice(METHODOLOGIES)))
+    db.write(lambda conn: conn.executemany(
+        'INSERT INTO schemes (filename, code, prompt, methodology) VALUES (?, ?, ?, ?)', rows
+    ))
+
+
+def time_query(db, query, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        rows = db.search_schemes(query)
+        timings.append((time.perf_counter() - started) * 1000)
+    return rows, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость полнотекстового поиска по схемам.")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "search.db"))
+        started = time.perf_counter()
+        fill(db, args.rows, rng)
+        fill_seconds = time.perf_counter() - started
+
+        queries = {}
+        for query in QUERIES:
+            rows, timings = time_query(db, query, args.repeats)
+            queries[query] = {
+                "results": len(rows),
+                "median_ms": round(statistics.median(timings), 3),
+                "max_ms": round(max(timings), 3),
+            }
+        db.close()
+
+    result = {
+        "rows": args.rows,
+        "fts5": db.fts_enabled,
+        "fill_seconds": round(fill_seconds, 2),
+        "queries": queries,
+        "worst_median_ms": max(q["median_ms"] for q in queries.values()),
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=4))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    main()
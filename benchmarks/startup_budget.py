@@ -0,0 +1,50 @@
+import argparse
+import json
+import statistics
+
+from utils.startup import STARTUP_BUDGET_MS, FIRST_FRAME, run_probe
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка бюджета времени до первого кадра главного окна.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    # Первый запуск прогревает файловый кэш и .pyc, в медиану он не входит.
+    run_probe()
+    runs = []
+    for _ in range(max(1, args.runs)):
+        probe, wall_ms, _ = run_probe()
+        runs.append({"phases": probe["phases"], "deferred_loaded": probe["deferred_loaded"], "wall_ms": round(wall_ms, 1)})
+
+    first_frame = [run["phases"][FIRST_FRAME] for run in runs]
+    deferred_loaded = sorted({m for run in runs for m in run["deferred_loaded"]})
+    median_ms = statistics.median(first_frame)
+    result = {
+        "budget_ms": args.budget_ms,
+        "first_frame_median_ms": median_ms,
+        "first_frame_max_ms": max(first_frame),
+        "deferred_loaded": deferred_loaded,
+        "runs": runs,
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=4))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=4)
+
+    failed = False
+    if median_ms > args.budget_ms:
+        print(f"Бюджет превышен: первый кадр через {median_ms:.0f} мс при бюджете {args.budget_ms:.0f} мс.")
+        failed = True
+    if deferred_loaded:
+        print(f"До первого кадра загружены отложенные пакеты: {', '.join(deferred_loaded)}.")
+        failed = True
+    if not failed:
+        print(f"Первый кадр через {median_ms:.0f} мс, бюджет {args.budget_ms:.0f} мс соблюдён.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,250 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from io import BytesIO
+
+from db.database import Database
+from utils.dirs import PLANTUML_JAR_PATH
+from utils.llm import StubBackend
+from utils.pipeline import agenerate_scheme
+from utils.plantuml import extract_plantuml_code, generate_plantuml_diagram
+from utils.plantuml_server import shutdown_render_servers
+from utils.telemetry import percentile
+
+SECTIONS = ("render", "pipeline", "extract", "db", "thumbnails")
+DB_SIZES = (1000, 10000, 100000)
+DB_OPERATIONS = 200
+RENDER_REPEATS = 20
+PIPELINE_RUNS = 10
+EXTRACT_SIZES_KB = (10, 100, 1000)
+THUMBNAIL_IMAGE_SIZE = (2400, 1600)
+
+DIAGRAM = """@startuml
+title Бенчмарк {n}
+actor Пользователь
+participant "Сервис {n}" as S
+database БД
+Пользователь -> S: запрос {n}
+S -> БД: SELECT {n}
+БД --> S: строки
+S --> Пользователь: ответ
+@enduml"""
+
+
+def timings_summary(values_ms):
+    return {
+        "runs": len(values_ms),
+        "mean_ms": round(statistics.mean(values_ms), 3),
+        "p50_ms": round(percentile(values_ms, 50), 3),
+        "p95_ms": round(percentile(values_ms, 95), 3),
+    }
+
+
+def measure(fn, repeats):
+    values = []
+    for i in range(repeats):
+        started = time.perf_counter()
+        fn(i)
+        values.append((time.perf_counter() - started) * 1000)
+    return values
+
+
+def bench_render(jar_path, tmp):
+    # Холодный рендер включает запуск JVM, тёплые идут через уже запущенный процесс.
+    shutdown_render_servers()
+    started = time.perf_counter()
+    generate_plantuml_diagram(DIAGRAM.format(n=0), tmp, "cold", jar_path)
+    cold_ms = (time.perf_counter() - started) * 1000
+    warm = measure(lambda i: generate_plantuml_diagram(DIAGRAM.format(n=i + 1), tmp, f"warm{i}", jar_path), RENDER_REPEATS)
+    shutdown_render_servers()
+    return {"cold_ms": round(cold_ms, 3), "warm": timings_summary(warm)}
+
+
+def bench_pipeline(jar_path):
+    backend = StubBackend(latency=0.0)
+
+    async def run():
+        values = []
+        for i in range(PIPELINE_RUNS):
+            started = time.perf_counter()
+            await agenerate_scheme(f"Схема бенчмарка {i}", backend, jar_path, 3, retry_delay=0)
+            values.append((time.perf_counter() - started) * 1000)
+        return values
+
+    try:
+        return timings_summary(asyncio.run(run()))
+    finally:
+        shutdown_render_servers()
+
+
+def large_response(size_kb, rng):
+    words = ["схема", "сервис", "запрос", "ответ", "диаграмма", "класс", "модуль", "поток"]
+    prose = []
+    total = 0
+    while total < size_kb * 1024:
+        line = " ".join(rng.choice(words) for _ in range(12))
+        prose.append(line)
+        total += len(line.encode("utf-8")) + 1
+    middle = len(prose) // 2
+    return "\n".join(prose[:middle] + ["```plantuml", DIAGRAM.format(n=size_kb), "```"] + prose[middle:])
+
+
+def bench_extract(rng):
+    results = {}
+    for size_kb in EXTRACT_SIZES_KB:
+        text = large_response(size_kb, rng)
+        repeats = max(3, 2000 // size_kb)
+        values = measure(lambda i: extract_plantuml_code(text), repeats)
+        mb = len(text.encode("utf-8")) / (1024 * 1024)
+        results[f"{size_kb}kb"] = {
+            **timings_summary(values),
+            "mb_per_s": round(mb / (statistics.mean(values) / 1000), 2),
+            "found": extract_plantuml_code(text) is not None,
+        }
+    return results
+
+
+def bench_db(tmp, sizes, rng):
+    results = {}
+    image = bytes(rng.getrandbits(8) for _ in range(4096))
+    for size in sizes:
+        db = Database(os.path.join(tmp, f"bench_{size}.db"))
+        prefill = [
+            (f"prefill_{i}", DIAGRAM.format(n=i), f"Промт {i}", "UML", time.time(), "stub", 1, 0.1)
+            for i in range(size - DB_OPERATIONS)
+        ]
+        db.write(lambda conn: conn.executemany('''
+            INSERT INTO schemes (filename, code, prompt, methodology, created_at, model, attempts, duration)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', prefill))
+        ids = []
+        add = measure(
+            lambda i: ids.append(db.add_scheme(f"bench_{i}", DIAGRAM.format(n=i), None, image + i.to_bytes(4, "big"))[0]),
+            DB_OPERATIONS,
+        )
+        max_id = db.read().execute('SELECT MAX(id) FROM schemes').fetchone()[0]
+        get = measure(lambda i: db.get_scheme_by_id(rng.randint(1, max_id)), DB_OPERATIONS * 5)
+        page = measure(lambda i: db.get_schemes_page(rng.randint(1, max_id), 200), DB_OPERATIONS)
+        db.close()
+        results[str(size)] = {
+            "add_scheme": timings_summary(add),
+            "get_scheme_by_id": timings_summary(get),
+            "get_schemes_page": timings_summary(page),
+        }
+    return results
+
+
+def bench_thumbnails(rng):
+    from PIL import Image, ImageDraw
+
+    from utils.thumbnails import make_thumbnails
+
+    img = Image.new("RGB", THUMBNAIL_IMAGE_SIZE, "white")
+    draw = ImageDraw.Draw(img)
+    for _ in range(400):
+        x, y = rng.randrange(THUMBNAIL_IMAGE_SIZE[0]), rng.randrange(THUMBNAIL_IMAGE_SIZE[1])
+        draw.rectangle((x, y, x + rng.randint(20, 200), y + rng.randint(10, 60)), outline="black")
+        draw.text((x + 4, y + 4), f"node {x}", fill="black")
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    png = buf.getvalue()
+
+    def decode(data):
+        with Image.open(BytesIO(data)) as decoded:
+            decoded.load()
+
+    build = measure(lambda i: make_thumbnails(png), 3)
+    thumbs = make_thumbnails(png)
+    results = {
+        "source_bytes": len(png),
+        "build_pyramid": timings_summary(build),
+        "decode_full": timings_summary(measure(lambda i: decode(png), 10)),
+    }
+    for size, _, _, _, data in thumbs:
+        results[f"decode_{size}"] = {**timings_summary(measure(lambda i: decode(data), 20)), "bytes": len(data)}
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline, path=""):
+    # Печатаем изменение каждой метрики времени относительно сохранённого прогона.
+    for key, value in results.items():
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        name = f"{path}.{key}" if path else key
+        if isinstance(value, dict):
+            compare(value, old or {}, name)
+        elif key.endswith("_ms") and isinstance(old, (int, float)) and old:
+            change = (value - old) / old * 100
+            print(f"{name:<50}{old:>12.3f}{value:>12.3f}{change:>+9.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки генерации, рендера и хранения схем.")
+    parser.add_argument("--jar", default=str(PLANTUML_JAR_PATH))
+    parser.add_argument("--only", nargs="+", choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument("--db-sizes", nargs="+", type=int, default=list(DB_SIZES))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="записать результаты в JSON")
+    parser.add_argument("--baseline", default=None, help="JSON предыдущего прогона для сравнения")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    has_jar = os.path.isfile(args.jar)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for section in args.only:
+            print(f"Бенчмарк: {section}...")
+            try:
+                if section == "render":
+                    results[section] = bench_render(args.jar, tmp) if has_jar else {"skipped": "plantuml.jar не найден"}
+                elif section == "pipeline":
+                    results[section] = bench_pipeline(args.jar) if has_jar else {"skipped": "plantuml.jar не найден"}
+                elif section == "extract":
+                    results[section] = bench_extract(rng)
+                elif section == "db":
+                    results[section] = bench_db(tmp, args.db_sizes, rng)
+                elif section == "thumbnails":
+                    results[section] = bench_thumbnails(rng)
+            except ImportError as e:
+                results[section] = {"skipped": f"нет зависимости: {e.name}"}
+            except Exception as e:
+                results[section] = {"error": str(e)}
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "results": results,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=4))
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nСравнение с {baseline.get('commit')}:")
+        compare(results, baseline.get("results", {}))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,68 +1,224 @@
+import hashlib
 import sqlite3
-import threading
 import os
+import re
+import time
+from contextlib import contextmanager
+from io import BytesIO
 from pathlib import Path
 
+from db.migrations import migrate, SEARCH_COLUMNS
+from db.storage import SQLiteStorage
+from utils.telemetry import span
+
 DB_PATH = Path.home() / "PlantGPT" / "DB" / "plantuml_schemes.db"
+BLOB_CHUNK_SIZE = 256 * 1024
+_SEARCH_TERM_RE = re.compile(r"\w+", re.UNICODE)
 
 class Database:
     def __init__(self, db_path=DB_PATH):
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.cursor = self.conn.cursor()
-        self.lock = threading.Lock()
-        self.create_table()
+        self.storage = SQLiteStorage(db_path)
+        self.fts_enabled = False
+        try:
+            self.create_table()
+        except Exception:
+            self.storage.close()
+            raise
+
+    def read(self):
+        return self.storage.read()
+
+    def write(self, fn, *args):
+        return self.storage.write(fn, *args)
+
+    def submit(self, fn, *args):
+        return self.storage.submit(fn, *args)
 
     def create_table(self):
-        with self.lock:
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS schemes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    filename TEXT UNIQUE,
-                    code TEXT,
-                    image_path TEXT,
-                    image_data BLOB
-                )
-            ''')
-            self.conn.commit()
-
-    def add_scheme(self, filename, code, image_path):
-        with self.lock:
-            image_data = None
+        self.write(migrate)
+        self.fts_enabled = self.read().execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='schemes_fts'"
+        ).fetchone() is not None
+
+    def _store_image(self, conn, image_data, digest=None, image_format="png"):
+        if digest is None:
+            digest = hashlib.sha256(image_data).hexdigest()
+        conn.execute('INSERT OR IGNORE INTO images (hash, size, data, format) VALUES (?, ?, ?, ?)',
+                     (digest, len(image_data), image_data, image_format))
+        return conn.execute('SELECT id FROM images WHERE hash=?', (digest,)).fetchone()[0]
+
+    def _release_image(self, conn, image_id):
+        if image_id is None:
+            return
+        cursor = conn.execute('''
+            DELETE FROM images WHERE id=? AND NOT EXISTS (SELECT 1 FROM schemes WHERE image_id=?)
+        ''', (image_id, image_id))
+        if cursor.rowcount:
+            conn.execute('DELETE FROM thumbnails WHERE image_id=?', (image_id,))
+            conn.execute('DELETE FROM tiles WHERE image_id=?', (image_id,))
+            conn.execute('DELETE FROM tile_sets WHERE image_id=?', (image_id,))
+
+    def add_scheme(self, filename, code, image_path=None, image_data=None, prompt=None, methodology=None,
+                   model=None, attempts=None, duration=None, image_format="png"):
+        if image_data is None and image_path:
             try:
                 with open(image_path, "rb") as f:
                     image_data = f.read()
             except Exception:
                 pass
-            self.cursor.execute('''
-                INSERT OR REPLACE INTO schemes (filename, code, image_path, image_data)
-                VALUES (?, ?, ?, ?)
-            ''', (filename, code, image_path, image_data))
-            self.conn.commit()
+        # Хэш считаем в вызывающем потоке, чтобы не занимать поток записи.
+        digest = hashlib.sha256(image_data).hexdigest() if image_data else None
+        metadata = (prompt, methodology, time.time(), model, attempts, duration)
+        with span("db_write"):
+            return self.write(self._add_scheme, filename, code, image_path, image_data, digest, metadata, image_format)
+
+    def _add_scheme(self, conn, filename, code, image_path, image_data, digest, metadata, image_format):
+        previous = conn.execute('SELECT image_id FROM schemes WHERE filename=?', (filename,)).fetchone()
+        image_id = self._store_image(conn, image_data, digest, image_format) if image_data else None
+        # Явный DELETE вместо REPLACE: иначе триггеры удаления не срабатывают
+        # и полнотекстовый индекс расходится с таблицей.
+        if previous:
+            conn.execute('DELETE FROM schemes WHERE filename=?', (filename,))
+        cursor = conn.execute('''
+            INSERT INTO schemes (filename, code, image_path, image_id, prompt, methodology,
+                                 created_at, model, attempts, duration)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (filename, code, image_path, image_id) + metadata)
+        scheme_id = cursor.lastrowid
+        if previous and previous[0] != image_id:
+            self._release_image(conn, previous[0])
+        return scheme_id, image_id
 
     def get_all_schemes(self):
-        with self.lock:
-            self.cursor.execute('SELECT id, filename FROM schemes ORDER BY id DESC')
-            return self.cursor.fetchall()
+        return self.read().execute('SELECT id, filename FROM schemes ORDER BY id DESC').fetchall()
+
+    def get_schemes_page(self, before_id=None, limit=200):
+        # Keyset-пагинация по id: страница не зависит от OFFSET и числа строк.
+        if before_id is None:
+            return self.read().execute('SELECT id, filename FROM schemes ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return self.read().execute('SELECT id, filename FROM schemes WHERE id < ? ORDER BY id DESC LIMIT ?',
+                                   (before_id, limit)).fetchall()
+
+    def search_schemes(self, query, before_id=None, limit=200):
+        terms = _SEARCH_TERM_RE.findall(query)
+        if not terms:
+            return self.get_schemes_page(before_id, limit)
+        if self.fts_enabled:
+            # Каждое слово — префиксный запрос, слова объединяются через AND.
+            match = " ".join(f'"{term}"*' for term in terms)
+            sql = 'SELECT rowid, filename FROM schemes_fts WHERE schemes_fts MATCH ?'
+            params = [match]
+            if before_id is not None:
+                sql += ' AND rowid < ?'
+                params.append(before_id)
+            sql += ' ORDER BY rowid DESC LIMIT ?'
+        else:
+            conditions = []
+            params = []
+            for term in terms:
+                conditions.append("(" + " OR ".join(f"{c} LIKE ?" for c in SEARCH_COLUMNS) + ")")
+                params.extend([f"%{term}%"] * len(SEARCH_COLUMNS))
+            sql = 'SELECT id, filename FROM schemes WHERE ' + " AND ".join(conditions)
+            if before_id is not None:
+                sql += ' AND id < ?'
+                params.append(before_id)
+            sql += ' ORDER BY id DESC LIMIT ?'
+        params.append(limit)
+        return self.read().execute(sql, params).fetchall()
 
     def get_scheme_by_id(self, scheme_id):
-        with self.lock:
-            self.cursor.execute('SELECT filename, code, image_path, image_data FROM schemes WHERE id=?', (scheme_id,))
-            return self.cursor.fetchone()
+        return self.read().execute(
+            'SELECT filename, code, image_path, image_id FROM schemes WHERE id=?', (scheme_id,)
+        ).fetchone()
+
+    @contextmanager
+    def open_image(self, image_id):
+        conn = self.read()
+        if hasattr(conn, "blobopen"):
+            with conn.blobopen("images", "data", image_id, readonly=True) as blob:
+                yield blob
+        else:
+            row = conn.execute('SELECT data FROM images WHERE id=?', (image_id,)).fetchone()
+            if row is None:
+                raise sqlite3.OperationalError(f"no such image: {image_id}")
+            yield BytesIO(row[0])
+
+    def read_image(self, image_id):
+        with span("db_read_image"), self.open_image(image_id) as blob:
+            return blob.read()
+
+    def image_format(self, image_id):
+        row = self.read().execute('SELECT format FROM images WHERE id=?', (image_id,)).fetchone()
+        return row[0] if row else None
+
+    def export_image(self, image_id, path):
+        with self.open_image(image_id) as blob, open(path, "wb") as f:
+            for chunk in iter(lambda: blob.read(BLOB_CHUNK_SIZE), b""):
+                f.write(chunk)
+
+    def add_thumbnails(self, image_id, thumbs):
+        rows = [(image_id, size, w, h, int(full), data) for size, w, h, full, data in thumbs]
+        self.write(lambda conn: conn.executemany('''
+            INSERT OR REPLACE INTO thumbnails (image_id, size, width, height, full, data)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows))
+
+    def get_thumbnail_sizes(self, image_id):
+        rows = self.read().execute('''
+            SELECT size, width, height, full FROM thumbnails WHERE image_id=? ORDER BY size
+        ''', (image_id,)).fetchall()
+        return [(size, w, h, bool(full)) for size, w, h, full in rows]
+
+    def get_thumbnail(self, image_id, size):
+        row = self.read().execute('SELECT data FROM thumbnails WHERE image_id=? AND size=?', (image_id, size)).fetchone()
+        return row[0] if row else None
+
+    def images_without_thumbnails(self):
+        rows = self.read().execute('''
+            SELECT id FROM images WHERE format='png'
+              AND NOT EXISTS (SELECT 1 FROM thumbnails WHERE thumbnails.image_id = images.id)
+        ''').fetchall()
+        return [row[0] for row in rows]
+
+    def add_tiles(self, image_id, level, tiles):
+        rows = [(image_id, level, col, row, data) for col, row, data in tiles]
+        self.write(lambda conn: conn.executemany('''
+            INSERT OR REPLACE INTO tiles (image_id, level, col, row, data) VALUES (?, ?, ?, ?, ?)
+        ''', rows))
+
+    def set_tile_set(self, image_id, tile_size, width, height, levels):
+        self.write(lambda conn: conn.execute('''
+            INSERT OR REPLACE INTO tile_sets (image_id, tile_size, width, height, levels) VALUES (?, ?, ?, ?, ?)
+        ''', (image_id, tile_size, width, height, levels)))
+
+    def get_tile_set(self, image_id):
+        return self.read().execute(
+            'SELECT tile_size, width, height, levels FROM tile_sets WHERE image_id=?', (image_id,)
+        ).fetchone()
+
+    def get_tile(self, image_id, level, col, row):
+        result = self.read().execute(
+            'SELECT data FROM tiles WHERE image_id=? AND level=? AND col=? AND row=?', (image_id, level, col, row)
+        ).fetchone()
+        return result[0] if result else None
 
     def delete_scheme_by_id(self, scheme_id):
-        with self.lock:
-            self.cursor.execute('SELECT image_path FROM schemes WHERE id=?', (scheme_id,))
-            row = self.cursor.fetchone()
-            if row:
-                image_path = row[0]
-                try:
-                    if image_path and os.path.isfile(image_path):
-                        os.remove(image_path)
-                except Exception:
-                    pass
-            self.cursor.execute('DELETE FROM schemes WHERE id=?', (scheme_id,))
-            self.conn.commit()
+        with span("db_delete"):
+            row = self.write(self._delete_scheme, scheme_id)
+        if row:
+            image_path = row[0]
+            try:
+                if image_path and os.path.isfile(image_path):
+                    os.remove(image_path)
+            except Exception:
+                pass
+
+    def _delete_scheme(self, conn, scheme_id):
+        row = conn.execute('SELECT image_path, image_id FROM schemes WHERE id=?', (scheme_id,)).fetchone()
+        conn.execute('DELETE FROM schemes WHERE id=?', (scheme_id,))
+        if row:
+            self._release_image(conn, row[1])
+        return row
 
     def close(self):
-        with self.lock:
-            self.conn.close()
+        self.storage.close()
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import time
+
+from utils.text_utils import estimate_tokens
+
+DEFAULT_LLM_CACHE_TTL_HOURS = 24 * 7
+
+
+def llm_cache_key(model, messages):
+    payload = json.dumps({"model": model, "messages": messages}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, db, ttl_hours=DEFAULT_LLM_CACHE_TTL_HOURS):
+        self.db = db
+        self.set_ttl(ttl_hours)
+        self.create_table()
+
+    def set_ttl(self, ttl_hours):
+        try:
+            self.ttl = max(0.0, float(ttl_hours) * 3600)
+        except (TypeError, ValueError):
+            self.ttl = DEFAULT_LLM_CACHE_TTL_HOURS * 3600
+
+    def create_table(self):
+        self.db.write(self._create_table)
+
+    def _create_table(self, conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                messages TEXT,
+                response TEXT,
+                created_at REAL,
+                latency REAL,
+                prompt_tokens INTEGER,
+                response_tokens INTEGER,
+                hits INTEGER DEFAULT 0,
+                partial INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        # partial — поток остановлен после первой диаграммы, ответ без окончания.
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(llm_cache)')}
+        if "partial" not in columns:
+            conn.execute('ALTER TABLE llm_cache ADD COLUMN partial INTEGER NOT NULL DEFAULT 0')
+
+    def _lookup(self, model, messages, max_age, allow_partial):
+        key = llm_cache_key(model, messages)
+        row = self.db.read().execute(
+            'SELECT response, created_at, partial FROM llm_cache WHERE key=?', (key,)
+        ).fetchone()
+        if not row:
+            return None
+        response, created_at, partial = row
+        # Обрезанный ответ годится только потоковому чтению до первой диаграммы.
+        if partial and not allow_partial:
+            return None
+        if max_age is not None and time.time() - created_at > max_age:
+            return None
+        self.db.submit(lambda conn: conn.execute('UPDATE llm_cache SET hits = hits + 1 WHERE key=?', (key,)))
+        return response
+
+    def get(self, model, messages, allow_partial=False):
+        if self.ttl <= 0:
+            return None
+        return self._lookup(model, messages, self.ttl, allow_partial)
+
+    def replay(self, model, messages, allow_partial=False):
+        return self._lookup(model, messages, None, allow_partial)
+
+    def put(self, model, messages, response, latency, partial=False):
+        prompt_tokens = sum(estimate_tokens(m.get("content", "")) for m in messages)
+        row = (
+            llm_cache_key(model, messages), model, json.dumps(messages, ensure_ascii=False),
+            response, time.time(), latency, prompt_tokens, estimate_tokens(response), int(partial),
+        )
+        self.db.submit(lambda conn: conn.execute('''
+            INSERT OR REPLACE INTO llm_cache
+                (key, model, messages, response, created_at, latency, prompt_tokens, response_tokens, hits, partial)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?)
+        ''', row))
+
+    def invalidate(self, model, messages):
+        key = llm_cache_key(model, messages)
+        self.db.submit(lambda conn: conn.execute('DELETE FROM llm_cache WHERE key=?', (key,)))
+
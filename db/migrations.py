@@ -0,0 +1,201 @@
+import hashlib
+import sqlite3
+
+SEARCH_COLUMNS = ("filename", "code", "prompt", "methodology")
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def _table_exists(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name=?", (name,)).fetchone() is not None
+
+
+def _store_image(conn, image_data):
+    digest = hashlib.sha256(image_data).hexdigest()
+    conn.execute('INSERT OR IGNORE INTO images (hash, size, data) VALUES (?, ?, ?)',
+                 (digest, len(image_data), image_data))
+    return conn.execute('SELECT id FROM images WHERE hash=?', (digest,)).fetchone()[0]
+
+
+def _base_schema(conn):
+    # Версия 1 собирает все прежние варианты таблицы schemes: изображения
+    # в отдельной таблице, промт и методология в колонках.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hash TEXT UNIQUE,
+            size INTEGER,
+            data BLOB
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schemes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT UNIQUE,
+            code TEXT,
+            image_path TEXT,
+            image_id INTEGER REFERENCES images(id),
+            prompt TEXT,
+            methodology TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS thumbnails (
+            image_id INTEGER REFERENCES images(id),
+            size INTEGER,
+            width INTEGER,
+            height INTEGER,
+            full INTEGER,
+            data BLOB,
+            PRIMARY KEY (image_id, size)
+        )
+    ''')
+    columns = _columns(conn, "schemes")
+    if "image_data" in columns:
+        _migrate_inline_images(conn)
+    for column in ("prompt", "methodology"):
+        if column not in columns:
+            conn.execute(f'ALTER TABLE schemes ADD COLUMN {column} TEXT')
+
+
+def _migrate_inline_images(conn):
+    # Старые базы хранили PNG прямо в schemes.image_data: переносим в images.
+    conn.execute('''
+        CREATE TABLE schemes_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT UNIQUE,
+            code TEXT,
+            image_path TEXT,
+            image_id INTEGER REFERENCES images(id)
+        )
+    ''')
+    rows = conn.execute('SELECT id, filename, code, image_path, image_data FROM schemes').fetchall()
+    for scheme_id, filename, code, image_path, image_data in rows:
+        image_id = _store_image(conn, image_data) if image_data else None
+        conn.execute('''
+            INSERT INTO schemes_new (id, filename, code, image_path, image_id)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (scheme_id, filename, code, image_path, image_id))
+    conn.execute('DROP TABLE schemes')
+    conn.execute('ALTER TABLE schemes_new RENAME TO schemes')
+
+
+def _search_index(conn):
+    if _table_exists(conn, "schemes_fts"):
+        return
+    try:
+        conn.execute(f'''
+            CREATE VIRTUAL TABLE schemes_fts USING fts5(
+                {", ".join(SEARCH_COLUMNS)}, content='schemes', content_rowid='id'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"FTS5 недоступен, поиск будет работать через LIKE: {e}")
+        return
+    # Внешний контент: индекс хранит только токены, строки читаются из schemes.
+    columns = ", ".join(SEARCH_COLUMNS)
+    new_values = ", ".join(f"new.{c}" for c in SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{c}" for c in SEARCH_COLUMNS)
+    conn.execute(f'''
+        CREATE TRIGGER schemes_fts_insert AFTER INSERT ON schemes BEGIN
+            INSERT INTO schemes_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER schemes_fts_delete AFTER DELETE ON schemes BEGIN
+            INSERT INTO schemes_fts (schemes_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER schemes_fts_update AFTER UPDATE ON schemes BEGIN
+            INSERT INTO schemes_fts (schemes_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO schemes_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    ''')
+    conn.execute("INSERT INTO schemes_fts (schemes_fts) VALUES ('rebuild')")
+
+
+def _generation_metadata(conn):
+    columns = _columns(conn, "schemes")
+    for column, column_type in (("created_at", "REAL"), ("model", "TEXT"), ("attempts", "INTEGER"), ("duration", "REAL")):
+        if column not in columns:
+            conn.execute(f'ALTER TABLE schemes ADD COLUMN {column} {column_type}')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_schemes_created_at ON schemes(created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_schemes_methodology ON schemes(methodology, created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_schemes_model ON schemes(model, created_at)')
+    # Проверка "изображение ещё используется" при удалении схемы.
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_schemes_image_id ON schemes(image_id)')
+
+
+def _metrics(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL,
+            kind TEXT,
+            name TEXT,
+            value REAL,
+            attrs TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_metrics_kind_ts ON metrics(kind, ts)')
+
+
+def _image_format(conn):
+    # До версии 5 все изображения были PNG.
+    if "format" not in _columns(conn, "images"):
+        conn.execute("ALTER TABLE images ADD COLUMN format TEXT NOT NULL DEFAULT 'png'")
+
+
+def _tiles(conn):
+    # Пирамида тайлов для просмотрщика; tile_sets пишется последним, когда все уровни готовы.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tile_sets (
+            image_id INTEGER PRIMARY KEY REFERENCES images(id),
+            tile_size INTEGER,
+            width INTEGER,
+            height INTEGER,
+            levels INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tiles (
+            image_id INTEGER REFERENCES images(id),
+            level INTEGER,
+            col INTEGER,
+            row INTEGER,
+            data BLOB,
+            PRIMARY KEY (image_id, level, col, row)
+        )
+    ''')
+
+
+# Порядок менять нельзя: номер версии базы — это число применённых миграций.
+MIGRATIONS = [
+    _base_schema,
+    _search_index,
+    _generation_metadata,
+    _metrics,
+    _image_format,
+    _tiles,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn):
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"База данных создана более новой версией программы (схема {version}, поддерживается {SCHEMA_VERSION})"
+        )
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        MIGRATIONS[number - 1](conn)
+        conn.execute(f'PRAGMA user_version={number}')
+    # Версия 2 засчитывается и без FTS5: индекс создаётся при первом запуске, где модуль появился.
+    if version >= 2 and not _table_exists(conn, "schemes_fts"):
+        _search_index(conn)
+    if version < SCHEMA_VERSION:
+        print(f"Схема базы данных обновлена: версия {version} -> {SCHEMA_VERSION}.")
+    return version
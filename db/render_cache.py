@@ -0,0 +1,90 @@
+import threading
+import time
+
+DEFAULT_RENDER_CACHE_MB = 64
+
+
+class RenderCache:
+    def __init__(self, db, max_mb=DEFAULT_RENDER_CACHE_MB):
+        self.db = db
+        self.set_limit(max_mb)
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+        self.create_table()
+
+    def set_limit(self, max_mb):
+        try:
+            self.max_bytes = max(0, int(float(max_mb) * 1024 * 1024))
+        except (TypeError, ValueError):
+            self.max_bytes = DEFAULT_RENDER_CACHE_MB * 1024 * 1024
+
+    def create_table(self):
+        self.db.write(self._create_table)
+
+    def _create_table(self, conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS render_cache (
+                key TEXT PRIMARY KEY,
+                data BLOB,
+                size INTEGER,
+                last_used REAL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_render_cache_last_used ON render_cache(last_used)')
+
+    def get(self, key):
+        row = self.db.read().execute('SELECT data FROM render_cache WHERE key=?', (key,)).fetchone()
+        if row:
+            # Отметку LRU обновляем в фоне: чтение не ждёт очереди записи.
+            self.db.submit(lambda conn: conn.execute('UPDATE render_cache SET last_used=? WHERE key=?', (time.time(), key)))
+        with self._stats_lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return row[0] if row else None
+
+    def put(self, key, data):
+        if self.max_bytes <= 0 or len(data) > self.max_bytes:
+            return
+        self.db.submit(self._put, key, data, time.time())
+
+    def _put(self, conn, key, data, now):
+        conn.execute('''
+            INSERT OR REPLACE INTO render_cache (key, data, size, last_used)
+            VALUES (?, ?, ?, ?)
+        ''', (key, data, len(data), now))
+        self._evict(conn)
+
+    def _evict(self, conn):
+        if conn.execute('SELECT COALESCE(SUM(size), 0) FROM render_cache').fetchone()[0] <= self.max_bytes:
+            return
+        conn.execute('''
+            DELETE FROM render_cache WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS total
+                    FROM render_cache
+                ) WHERE total > ?
+            )
+        ''', (self.max_bytes,))
+
+    def clear(self):
+        self.db.write(lambda conn: conn.execute('DELETE FROM render_cache'))
+        with self._stats_lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        entries, total = self.db.read().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM render_cache').fetchone()
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": total,
+            "limit_bytes": self.max_bytes,
+        }
@@ -0,0 +1,115 @@
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+WRITE_BATCH_SIZE = 64
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 16 * 1024
+MMAP_SIZE = 256 * 1024 * 1024
+
+
+class SQLiteStorage:
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._writes = queue.Queue()
+        self._closed = False
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        self._thread = threading.Thread(target=self._run_writer, daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        # isolation_level=None: транзакциями управляем сами, SELECT не держит снимок.
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def read(self):
+        # У каждого потока своё соединение для чтения: в WAL читатели не ждут писателя.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            conn.execute("PRAGMA query_only=1")
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def submit(self, fn, *args):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Хранилище закрыто")
+        future = Future()
+        self._writes.put((future, fn, args))
+        return future
+
+    def write(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+    def _run_writer(self):
+        while True:
+            task = self._writes.get()
+            if task is None:
+                return
+            batch = [task]
+            stop = False
+            # Всё, что успело накопиться в очереди, коммитим одной транзакцией.
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    task = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if task is None:
+                    stop = True
+                    break
+                batch.append(task)
+            self._apply(batch)
+            if stop:
+                return
+
+    def _apply(self, batch):
+        conn = self._writer
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for future, fn, args in batch:
+                conn.execute("SAVEPOINT task")
+                try:
+                    result = fn(conn, *args)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO task")
+                    conn.execute("RELEASE task")
+                    results.append((future, None, e))
+                else:
+                    conn.execute("RELEASE task")
+                    results.append((future, result, None))
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            results = [(future, None, e) for future, _, _ in batch]
+        # Результат отдаём только после COMMIT, чтобы читатели уже видели запись.
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._writes.put(None)
+        self._thread.join()
+        self._writer.close()
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            conn.close()
@@ -1,24 +1,42 @@
 import customtkinter as ctk
-import tkinter as tk
 from tkinter import messagebox
-from PIL import Image, ImageTk
 import os
-import threading
+import queue
 import shutil
-import time
+import threading
 from io import BytesIO
 
 from db.database import Database
+from db.render_cache import RenderCache, DEFAULT_RENDER_CACHE_MB
+from db.llm_cache import LLMCache, DEFAULT_LLM_CACHE_TTL_HOURS
 from utils.dirs import ensure_dirs, IMAGES_DIR, METHODOLOGIES_DIR, PLANTUML_JAR_PATH
 from utils.config import load_config, save_config
-from utils.plantuml import extract_plantuml_code, generate_plantuml_diagram
+from utils.pipeline import generation_limits, INVALID_FILENAME_CHARS
+from utils.generation_service import GenerationService, GenerationJob, DEFAULT_GENERATION_WORKERS
+from utils.prompt import assemble_prompt
+from utils.plantuml import set_lint_enabled, output_format_from_config
+from utils.plantuml_server import set_render_workers, shutdown_render_servers, DEFAULT_RENDER_WORKERS
 from utils.text_utils import bind_ctrl_v
-from gui.code_viewer import CodeViewer
-from gui.settings_window import SettingsWindow
-from g4f import ChatCompletion
+from utils.llm import create_backend
+from utils.methodologies import get_store
+from utils.lru import LRUCache
+from utils.thumbnails import ThumbnailBuilder, pick_thumbnail
+from utils.svg_raster import SvgRasterizer, rasterizer_available, RASTERIZER_UNAVAILABLE
+from utils.telemetry import telemetry, span
+from utils import startup
+from gui.scheme_list import SchemeList
+
+PREVIEW_CACHE_SIZE = 32
+SEARCH_DEBOUNCE_MS = 250
+STREAM_PROGRESS_CHARS = 1500
+METHODOLOGY_POLL_MS = 500
+TOKEN_COUNT_DEBOUNCE_MS = 300
+RASTER_POLL_MS = 50
+NO_METHODOLOGY = "Не выбирать (GPT сам решит)"
+
 
 class PlantUMLApp(ctk.CTk):
-    def __init__(self):
+    def __init__(self, startup_probe=False):
         super().__init__()
         self.title("PlantGPT")
         self.geometry("1200x820")
@@ -29,8 +47,22 @@ class PlantUMLApp(ctk.CTk):
         ctk.set_appearance_mode(self.config_data.get("theme", "dark"))
 
         self.db = Database()
-        self.config_data = load_config()
+        telemetry.attach(self.db)
+        self.render_cache = RenderCache(self.db, self.config_data.get("render_cache_mb", DEFAULT_RENDER_CACHE_MB))
+        self.llm_cache = LLMCache(self.db, self.config_data.get("llm_cache_ttl_hours", DEFAULT_LLM_CACHE_TTL_HOURS))
+        self.generation = GenerationService(self.db, self.config_data.get("generation_workers", DEFAULT_GENERATION_WORKERS))
+        self.thumbnails = ThumbnailBuilder(self.db)
+        self.preview_cache = LRUCache(PREVIEW_CACHE_SIZE)
+        self.rasterizer = SvgRasterizer(self.db)
+        self.preview_key = None
+        self.pending_jobs = set()
+        self.current_job_id = None
+        self.progress_attempt = 0
         self.failed_attempts = 0
+        self.startup_probe = startup_probe
+        self.methodologies = get_store(METHODOLOGIES_DIR)
+        self.methodologies_version = None
+        self.startup_results = queue.Queue()
 
         top_frame = ctk.CTkFrame(self)
         top_frame.pack(fill="x", padx=10, pady=5)
@@ -41,12 +73,13 @@ class PlantUMLApp(ctk.CTk):
         self.filename_entry.pack(side="left", padx=5)
 
         ctk.CTkLabel(top_frame, text="Методология:").pack(side="left", padx=(20,0))
-        self.methodology_var = ctk.StringVar(value="Не выбирать (GPT сам решит)")
-        self.methodology_var = ctk.StringVar(value="Не выбирать (GPT сам решит)")
-        self.methodology_menu = ctk.CTkComboBox(top_frame, variable=self.methodology_var, width=300)
+        self.methodology_var = ctk.StringVar(value=NO_METHODOLOGY)
+        self.methodology_menu = ctk.CTkComboBox(top_frame, variable=self.methodology_var, values=[NO_METHODOLOGY], width=300,
+                                                command=lambda value: self.schedule_token_count())
         self.methodology_menu.pack(side="left", padx=5)
 
         ctk.CTkButton(top_frame, text="Настройки", command=self.open_settings).pack(side="right")
+        ctk.CTkButton(top_frame, text="Статистика", command=self.open_stats).pack(side="right", padx=5)
 
         prompt_frame = ctk.CTkFrame(self)
         prompt_frame.pack(fill="x", padx=10, pady=5)
@@ -54,6 +87,8 @@ class PlantUMLApp(ctk.CTk):
         self.prompt_text = ctk.CTkTextbox(prompt_frame, height=120, font=("Consolas", 13))
         self.prompt_text.pack(fill="x")
         bind_ctrl_v(self.prompt_text)
+        self.prompt_text.bind("<KeyRelease>", lambda event: self.schedule_token_count(), add="+")
+        self.token_count_after_id = None
 
         clear_btn_frame = ctk.CTkFrame(prompt_frame)
         clear_btn_frame.pack(fill="x", pady=(5,0))
@@ -66,14 +101,25 @@ class PlantUMLApp(ctk.CTk):
                                         fg_color="#00cc77", command=self.on_generate)
         self.gen_button.pack(side="left")
 
+        self.cancel_button = ctk.CTkButton(action_frame, text="Отменить", width=100, fg_color="#cc3300",
+                                           hover_color="#ff4d4d", command=self.cancel_generation, state="disabled")
+        self.cancel_button.pack(side="left", padx=(10, 0))
+
         self.fail_label_var = ctk.StringVar(value="Неудачных попыток: 0")
         self.fail_label = ctk.CTkLabel(action_frame, textvariable=self.fail_label_var, text_color="red",
                                       font=("Segoe UI", 12, "bold"))
         self.fail_label.pack(side="left", padx=20)
 
-        self.progress = ctk.CTkProgressBar(self, mode="indeterminate")
-        self.progress.pack(pady=5)
-        self.progress.stop()
+        self.token_label_var = ctk.StringVar(value="")
+        ctk.CTkLabel(action_frame, textvariable=self.token_label_var).pack(side="left")
+
+        progress_frame = ctk.CTkFrame(self, fg_color="transparent")
+        progress_frame.pack(fill="x", padx=10, pady=5)
+        self.progress = ctk.CTkProgressBar(progress_frame, mode="determinate")
+        self.progress.pack(side="left", padx=(0, 10))
+        self.progress.set(0)
+        self.progress_var = ctk.StringVar(value="")
+        ctk.CTkLabel(progress_frame, textvariable=self.progress_var).pack(side="left")
 
         bottom_frame = ctk.CTkFrame(self)
         bottom_frame.pack(fill="both", expand=True, padx=10, pady=5)
@@ -82,17 +128,25 @@ class PlantUMLApp(ctk.CTk):
         left_frame.pack(side="left", fill="y")
 
         ctk.CTkLabel(left_frame, text="Сохранённые схемы:").pack(anchor="w")
-        self.scheme_listbox = tk.Listbox(left_frame, width=35, height=30)
+        self.search_var = ctk.StringVar()
+        self.search_entry = ctk.CTkEntry(left_frame, textvariable=self.search_var,
+                                         placeholder_text="Поиск по имени, коду и промту")
+        self.search_entry.pack(fill="x", pady=(0, 5))
+        self.search_entry.bind("<KeyRelease>", self.on_search_changed)
+        self.search_after_id = None
+        self.scheme_list = SchemeList(left_frame, self.db, width=35, height=30)
+        self.scheme_listbox = self.scheme_list.listbox
         self.scheme_listbox.pack(side="left", fill="y")
         self.scheme_listbox.bind("<<ListboxSelect>>", self.on_scheme_select)
 
-        scrollbar = ctk.CTkScrollbar(left_frame, orientation="vertical", command=self.scheme_listbox.yview)
+        scrollbar = ctk.CTkScrollbar(left_frame, orientation="vertical")
         scrollbar.pack(side="left", fill="y")
-        self.scheme_listbox.config(yscrollcommand=scrollbar.set)
+        self.scheme_list.attach_scrollbar(scrollbar)
 
         btn_frame = ctk.CTkFrame(left_frame)
         btn_frame.pack(pady=10, fill="x")
         ctk.CTkButton(btn_frame, text="Показать код", command=self.show_code).pack(fill="x", pady=2)
+        ctk.CTkButton(btn_frame, text="Открыть схему", command=self.open_viewer).pack(fill="x", pady=2)
         ctk.CTkButton(btn_frame, text="Загрузить код в промт", command=self.load_code_to_prompt).pack(fill="x", pady=2)
         ctk.CTkButton(btn_frame, text="Экспорт схемы в папку вывода", command=self.export_scheme_files).pack(fill="x", pady=2)
         ctk.CTkButton(btn_frame, text="Удалить выбранную схему", fg_color="#cc3300", hover_color="#ff4d4d",
@@ -104,11 +158,54 @@ class PlantUMLApp(ctk.CTk):
         ctk.CTkLabel(right_frame, text="Превью схемы:").pack(anchor="w")
         self.preview_label = ctk.CTkLabel(right_frame, fg_color="gray")
         self.preview_label.pack(fill="both", expand=True)
+        self.preview_label.bind("<Double-Button-1>", lambda event: self.open_viewer())
 
         self.apply_config()
-        self.load_methodologies()
-        self.load_scheme_list()
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
+        startup.mark("окно построено")
+        # Список методологий, первая страница схем и поиск изображений без миниатюр
+        # читаются в фоне: окно показывается, не дожидаясь диска.
+        threading.Thread(target=self.background_load, daemon=True).start()
+        self.after(0, self.on_first_frame)
+        self.after(20, self.poll_startup_results)
+        self.after(100, self.poll_generation_events)
+        self.after(RASTER_POLL_MS, self.poll_rasterized)
+        self.after(METHODOLOGY_POLL_MS, self.poll_methodologies)
+
+    def on_first_frame(self):
+        self.update_idletasks()
+        startup.first_frame()
+
+    def background_load(self):
+        try:
+            result = (self.methodologies.snapshot(), self.db.get_schemes_page(None, self.scheme_list.page_size))
+        except Exception as e:
+            print(f"Ошибка загрузки данных при запуске: {e}")
+            result = None
+        self.startup_results.put(result)
+        self.methodologies.start_watching()
+        try:
+            self.thumbnails.enqueue_missing()
+        except Exception as e:
+            print(f"Ошибка поиска изображений без миниатюр: {e}")
+
+    def poll_startup_results(self):
+        try:
+            result = self.startup_results.get_nowait()
+        except queue.Empty:
+            self.after(20, self.poll_startup_results)
+            return
+        if result is not None:
+            snapshot, rows = result
+            self.load_methodologies(snapshot)
+            self.scheme_list.show_first_page(rows)
+        else:
+            self.load_methodologies()
+            self.load_scheme_list()
+        startup.mark("данные загружены")
+        if self.startup_probe:
+            startup.report_probe()
+            self.on_closing()
 
     def clear_prompt(self):
         self.prompt_text.delete("0.0", "end")
@@ -117,7 +214,12 @@ class PlantUMLApp(ctk.CTk):
         self.prompt_text.delete("0.0", "end")
 
     def open_settings(self):
-        SettingsWindow(self, self.config_data, self.save_config, METHODOLOGIES_DIR, self.load_methodologies)
+        from gui.settings_window import SettingsWindow
+        SettingsWindow(self, self.config_data, self.save_config, self.methodologies, self.load_methodologies)
+
+    def open_stats(self):
+        from gui.stats_window import StatsWindow
+        StatsWindow(self, self.db)
 
     def on_settings_save(self, new_config):
         self.config_data = new_config
@@ -130,91 +232,124 @@ class PlantUMLApp(ctk.CTk):
             self.max_retries = int(self.config_data.get("max_retries", 5))
         except Exception:
             self.max_retries = 5
+        set_render_workers(self.config_data.get("render_workers", DEFAULT_RENDER_WORKERS))
+        set_lint_enabled(self.config_data.get("lint_plantuml", True))
+        self.render_cache.set_limit(self.config_data.get("render_cache_mb", DEFAULT_RENDER_CACHE_MB))
+        self.llm_cache.set_ttl(self.config_data.get("llm_cache_ttl_hours", DEFAULT_LLM_CACHE_TTL_HOURS))
+        self.llm_backend = create_backend(self.config_data, self.llm_cache)
+        self.schedule_token_count()
 
     def save_config(self, config=None):
         if config is None:
             config = self.config_data
         save_config(config)
         save_config(config)
+        self.apply_config()
 
-    def load_methodologies(self):
-        try:
-            files = [f for f in os.listdir(METHODOLOGIES_DIR) if f.endswith(".txt")]
-        except Exception:
-            files = []
-        self.loaded_methodologies = {}
-        for f in files:
-            try:
-                path = os.path.join(METHODOLOGIES_DIR, f)
-                with open(path, "r", encoding="utf-8") as file:
-                    desc = file.read().strip()
-                    name = os.path.splitext(f)[0]
-                    self.loaded_methodologies[name] = desc
-            except Exception:
-                pass
-        values = ["Не выбирать (GPT сам решит)"] + sorted(self.loaded_methodologies.keys())
+    def load_methodologies(self, snapshot=None):
+        # В меню нужны только имена: текст методологии читается, когда её выбирают.
+        if snapshot is None:
+            snapshot = self.methodologies.snapshot()
+        self.methodologies_version, names = snapshot
+        values = [NO_METHODOLOGY] + names
         self.methodology_menu.configure(values=values)
         if self.methodology_var.get() not in values:
-            self.methodology_var.set("Не выбирать (GPT сам решит)")
+            self.methodology_var.set(NO_METHODOLOGY)
+        self.schedule_token_count()
+
+    def poll_methodologies(self):
+        # Папку отслеживает хранилище (watchdog или опрос в фоне); здесь только сверяем версию.
+        if self.methodologies_version is not None and self.methodologies.version != self.methodologies_version:
+            self.load_methodologies()
+        self.after(METHODOLOGY_POLL_MS, self.poll_methodologies)
+
+    def assemble_current_prompt(self):
+        methodology = self.methodology_var.get()
+        methodology_prompt = ""
+        if methodology != NO_METHODOLOGY:
+            methodology_prompt = self.methodologies.get(methodology) or ""
+        prompt = self.prompt_text.get("0.0", "end").strip()
+        return methodology_prompt, assemble_prompt(prompt, methodology_prompt, self.config_data)
+
+    def schedule_token_count(self):
+        if self.token_count_after_id is not None:
+            self.after_cancel(self.token_count_after_id)
+        self.token_count_after_id = self.after(TOKEN_COUNT_DEBOUNCE_MS, self.update_token_count)
+
+    def update_token_count(self):
+        # Показываем размер промта в том виде, в каком он уйдёт модели.
+        self.token_count_after_id = None
+        _, build = self.assemble_current_prompt()
+        if not build.text:
+            self.token_label_var.set("")
+            return
+        text = f"Токенов в запросе: ~{build.tokens}"
+        if build.budget:
+            text += f" из {build.budget}"
+        if build.compacted:
+            # Сокращение меняет смысл запроса, поэтому о нём сообщаем рядом со счётчиком, а не только в консоли.
+            text += f" (сокращено с {build.original_tokens}). {build.notice()}"
+        self.token_label_var.set(text)
 
     def load_scheme_list(self):
-        self.scheme_listbox.delete(0, tk.END)
-        schemes = self.db.get_all_schemes()
-        for sid, fname in schemes:
-            self.scheme_listbox.insert("end", f"{sid}: {fname}")
+        self.scheme_list.reload()
+
+    def on_search_changed(self, event=None):
+        # Debounce: ищем, только когда пользователь перестал печатать.
+        if self.search_after_id is not None:
+            self.after_cancel(self.search_after_id)
+        self.search_after_id = self.after(SEARCH_DEBOUNCE_MS, self.apply_search)
+
+    def apply_search(self):
+        self.search_after_id = None
+        self.scheme_list.set_query(self.search_var.get())
 
     def on_scheme_select(self, event):
-        sel = self.scheme_listbox.curselection()
-        if not sel:
+        scheme_id = self.scheme_list.selected_id()
+        if scheme_id is None:
             return
-        idx = sel[0]
-        item_text = self.scheme_listbox.get(idx)
-        scheme_id = int(item_text.split(":")[0])
         data = self.db.get_scheme_by_id(scheme_id)
         if data:
-            filename, code, image_path, image_data = data
-            if image_data:
-                try:
-                    img = Image.open(BytesIO(image_data))
-                    img.thumbnail((self.preview_label.winfo_width(), self.preview_label.winfo_height()), Image.Resampling.LANCZOS)
-                    self.imgtk = ImageTk.PhotoImage(img)
-                    self.preview_label.configure(image=self.imgtk, text="")
-                except Exception as e:
-                    self.preview_label.configure(image="", text=f"Ошибка загрузки изображения:\n{e}")
-            else:
-                if image_path and os.path.isfile(image_path):
-                    try:
-                        img = Image.open(image_path)
-                        img.thumbnail((self.preview_label.winfo_width(), self.preview_label.winfo_height()), Image.Resampling.LANCZOS)
-                        self.imgtk = ImageTk.PhotoImage(img)
-                        self.preview_label.configure(image=self.imgtk, text="")
-                    except Exception as e:
-                        self.preview_label.configure(image="", text=f"Ошибка загрузки изображения:\n{e}")
+            filename, code, image_path, image_id = data
+            with span("preview"):
+                if image_id is not None:
+                    self.show_preview_image(image_id)
                 else:
-                    self.preview_label.configure(image="", text="Изображение не найдено")
+                    self.preview_key = None
+                    self.safe_show_preview(image_path)
             self.filename_var.set(filename)
 
     def show_code(self):
-        sel = self.scheme_listbox.curselection()
-        if not sel:
+        scheme_id = self.scheme_list.selected_id()
+        if scheme_id is None:
             messagebox.showwarning("Внимание", "Выберите схему из списка.")
             return
-        idx = sel[0]
-        item_text = self.scheme_listbox.get(idx)
-        scheme_id = int(item_text.split(":")[0])
         data = self.db.get_scheme_by_id(scheme_id)
         if data:
             _, code, _, _ = data
+            from gui.code_viewer import CodeViewer
             CodeViewer(self, code)
 
+    def open_viewer(self):
+        scheme_id = self.scheme_list.selected_id()
+        if scheme_id is None:
+            messagebox.showwarning("Внимание", "Выберите схему из списка.")
+            return
+        data = self.db.get_scheme_by_id(scheme_id)
+        if not data:
+            return
+        filename, _, _, image_id = data
+        if image_id is None:
+            messagebox.showwarning("Внимание", "Изображение схемы не сохранено в базе данных.")
+            return
+        from gui.diagram_viewer import DiagramViewer
+        DiagramViewer(self, self.db, image_id, filename)
+
     def load_code_to_prompt(self):
-        sel = self.scheme_listbox.curselection()
-        if not sel:
+        scheme_id = self.scheme_list.selected_id()
+        if scheme_id is None:
             messagebox.showwarning("Внимание", "Выберите схему из списка.")
             return
-        idx = sel[0]
-        item_text = self.scheme_listbox.get(idx)
-        scheme_id = int(item_text.split(":")[0])
         data = self.db.get_scheme_by_id(scheme_id)
         if data:
             _, code, _, _ = data
@@ -222,52 +357,52 @@ class PlantUMLApp(ctk.CTk):
             self.prompt_text.insert("0.0", code)
 
     def export_scheme_files(self):
-        sel = self.scheme_listbox.curselection()
-        if not sel:
+        scheme_id = self.scheme_list.selected_id()
+        if scheme_id is None:
             messagebox.showwarning("Внимание", "Выберите схему из списка.")
             return
-        idx = sel[0]
-        item_text = self.scheme_listbox.get(idx)
-        scheme_id = int(item_text.split(":")[0])
         data = self.db.get_scheme_by_id(scheme_id)
         if not data:
             messagebox.showerror("Ошибка", "Данные схемы не найдены.")
             return
-        filename, code, image_path, _ = data
+        filename, code, image_path, image_id = data
         output_dir = self.config_data.get("output_dir", str(IMAGES_DIR))
         if not os.path.isdir(output_dir):
             messagebox.showerror("Ошибка", "Некорректная папка вывода.")
             return
 
         try:
-            uml_path = os.path.join(output_dir, f"{filename}.uml")
-            with open(uml_path, "w", encoding="utf-8") as f:
-                f.write(code)
-
-            if image_path and os.path.isfile(image_path):
-                png_path = os.path.join(output_dir, os.path.basename(image_path))
-                shutil.copy2(image_path, png_path)
-            else:
-                png_path = None
+            with span("export"):
+                uml_path = os.path.join(output_dir, f"{filename}.uml")
+                with open(uml_path, "w", encoding="utf-8") as f:
+                    f.write(code)
+
+                if image_id is not None:
+                    image_format = self.db.image_format(image_id) or "png"
+                    export_path = os.path.join(output_dir, f"{filename}.{image_format}")
+                    self.db.export_image(image_id, export_path)
+                elif image_path and os.path.isfile(image_path):
+                    export_path = os.path.join(output_dir, os.path.basename(image_path))
+                    shutil.copy2(image_path, export_path)
+                else:
+                    export_path = None
 
             msg = f"Схема экспортирована:\n{uml_path}"
-            if png_path:
-                msg += f"\n{png_path}"
+            if export_path:
+                msg += f"\n{export_path}"
             messagebox.showinfo("Экспорт завершён", msg)
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка при экспорте: {e}")
 
     def delete_selected_scheme(self):
-        sel = self.scheme_listbox.curselection()
-        if not sel:
+        scheme_id = self.scheme_list.selected_id()
+        if scheme_id is None:
             messagebox.showwarning("Внимание", "Выберите схему для удаления.")
             return
-        idx = sel[0]
-        item_text = self.scheme_listbox.get(idx)
-        scheme_id = int(item_text.split(":")[0])
         if messagebox.askyesno("Подтверждение", f"Удалить схему ID {scheme_id}?"):
             self.db.delete_scheme_by_id(scheme_id)
-            self.load_scheme_list()
+            self.scheme_list.remove(scheme_id)
+            self.preview_key = None
             self.preview_label.configure(image="", text="")
             self.filename_var.set("")
             self.fail_label_var.set("Неудачных попыток: 0")
@@ -276,33 +411,18 @@ class PlantUMLApp(ctk.CTk):
         self.failed_attempts = 0
         self.fail_label_var.set(f"Неудачных попыток: {self.failed_attempts}")
 
-        prompt = self.prompt_text.get("0.0", "end").strip()
+        source_prompt = self.prompt_text.get("0.0", "end").strip()
         methodology = self.methodology_var.get()
-        methodology_prompt = self.loaded_methodologies.get(methodology, "")
+        methodology_prompt, build = self.assemble_current_prompt()
 
-        improve_prompt = self.config_data.get("improve_prompt", False)
         try:
             max_retries = int(self.config_data.get("max_retries", 5))
         except Exception:
             max_retries = 5
 
-        prompt_improve_1 = self.config_data.get("prompt_improve_1", "").strip()
-        prompt_improve_2 = self.config_data.get("prompt_improve_2", "").strip()
-
-        if improve_prompt:
-            combined_prompt = "Придумай схему, а затем сгенерируй код для PlantUML, чтобы он нарисовал схему, придуманную тобой. Далее подробное описание темы.\n\n"
-            combined_prompt += prompt
-            if methodology_prompt:
-                combined_prompt += f"\n\nИспользуй следующую методологию для рисования схемы:\n{methodology_prompt}"
-            if prompt_improve_1:
-                combined_prompt += f"\n\n{prompt_improve_1}"
-            if prompt_improve_2:
-                combined_prompt += f"\n\n{prompt_improve_2}"
-            combined_prompt += "\n\nПерепроверь код, сделай его ПОЛНОСТЬЮ корректным, чтобы PlantUML сгенерировал хорошую схему."
-            prompt = combined_prompt
-        else:
-            if methodology_prompt:
-                prompt += f"\n\nИспользуй следующую методологию для рисования схемы:\n{methodology_prompt}"
+        prompt = build.text
+        if build.compacted:
+            print(f"{build.notice()} {build.original_tokens} -> {build.tokens} токенов.")
 
         output_dir = self.config_data.get("output_dir", str(IMAGES_DIR))
         filename = self.filename_var.get().strip()
@@ -321,95 +441,201 @@ class PlantUMLApp(ctk.CTk):
         if not os.path.isdir(output_dir):
             messagebox.showerror("Ошибка", "Некорректная папка вывода.")
             return
-        if any(c in filename for c in r'\/:*?"<>|'):
+        if any(c in filename for c in INVALID_FILENAME_CHARS):
             messagebox.showerror("Ошибка", "Имя файла содержит недопустимые символы.")
             return
 
         self.save_config()
-        self.gen_button.configure(state="disabled")
-        self.progress.start()
+        self.preview_key = None
         self.preview_label.configure(image="", text="")
-        print("Отправка запроса ChatGPT...")
-
-        threading.Thread(target=self.worker_thread_retry, args=(prompt, output_dir, filename, jar_path, max_retries), daemon=True).start()
 
-    def worker_thread_retry(self, prompt, output_dir, filename, jar_path, max_retries):
-        current_prompt = prompt
-        self.failed_attempts = 0
-        self.after(0, lambda: self.fail_label_var.set(f"Неудачных попыток: {self.failed_attempts}"))
-        for attempt in range(1, max_retries + 1):
-            try:
-                response = ChatCompletion.create(
-                    model="gpt-4o",
-                    messages=[{"role": "user", "content": current_prompt}]
-                )
-                self.after(0, lambda: print(f"Ответ получен (попытка {attempt})."))
-                plantuml_code = extract_plantuml_code(response)
-                if not plantuml_code:
-                    self.after(0, lambda: print("Код PlantUML не найден в ответе."))
-                    self.after(0, lambda: messagebox.showerror("Ошибка", "Код PlantUML не найден в ответе."))
-                    self.after(0, lambda: self.progress.stop())
-                    self.after(0, lambda: self.gen_button.configure(state="normal"))
-                    return
-
-                self.after(0, lambda: print("Извлечён код PlantUML."))
-                self.after(0, lambda: print("Генерация схемы..."))
-                png_path = generate_plantuml_diagram(plantuml_code, output_dir, filename, jar_path)
-                self.after(0, lambda: print(f"Схема успешно сгенерирована: {png_path}"))
-
-                dest_img_path = os.path.join(IMAGES_DIR, f"{filename}.png")
-                with open(png_path, "rb") as f_src:
-                    data = f_src.read()
-                with open(dest_img_path, "wb") as f_dst:
-                    f_dst.write(data)
-
-                self.db.add_scheme(filename, plantuml_code, str(dest_img_path))
-                self.after(0, lambda: print("Схема и код сохранены в базе данных."))
-                self.after(0, lambda: messagebox.showinfo("Генерация завершена", f"Схема успешно сохранена:\n{dest_img_path}"))
-
-                self.after(0, lambda: self.load_scheme_list())
-                self.after(0, lambda: self.safe_show_preview(str(dest_img_path)))
-                self.after(0, lambda: self.progress.stop())
-                self.after(0, lambda: self.gen_button.configure(state="normal"))
+        candidates, deadline = generation_limits(self.config_data)
+        job = GenerationJob(prompt, filename, jar_path, max_retries, self.llm_backend, self.render_cache,
+                            candidates=candidates, deadline=deadline,
+                            source_prompt=source_prompt, methodology=methodology if methodology_prompt else None,
+                            output_format=output_format_from_config(self.config_data))
+        self.current_job_id = self.generation.submit(job)
+        self.pending_jobs.add(self.current_job_id)
+        self.update_generation_state()
+
+    def cancel_generation(self):
+        # Отменяется только последняя запущенная схема; остальные задачи в очереди продолжают работу.
+        if self.current_job_id in self.pending_jobs:
+            self.generation.cancel(self.current_job_id)
+
+    def update_generation_state(self):
+        if self.current_job_id in self.pending_jobs:
+            self.cancel_button.configure(state="normal")
+        else:
+            self.cancel_button.configure(state="disabled")
+
+    def set_progress(self, value, text, attempt=None):
+        # Внутри попытки полоса только растёт: кандидаты присылают события вперемешку.
+        if attempt is not None and attempt == self.progress_attempt:
+            value = max(value, self.progress.get())
+        if attempt is not None:
+            self.progress_attempt = attempt
+        self.progress.set(value)
+        self.progress_var.set(text)
+
+    def update_progress(self, event, info):
+        attempt = info.get("attempt")
+        if event == "queued":
+            self.set_progress(0, "В очереди...", 0)
+        elif event == "started":
+            self.set_progress(0.05, "Отправка запроса...", 0)
+        elif event == "stream":
+            # Длина ответа заранее неизвестна: доля растёт с каждым фрагментом, не достигая этапа рендера.
+            received = info["chars"] / (info["chars"] + STREAM_PROGRESS_CHARS)
+            text = f"Попытка {attempt}: получено символов {info['chars']}"
+            if info["code_lines"]:
+                text += f", строк кода {info['code_lines']}"
+            self.set_progress(0.1 + 0.6 * received, text, attempt)
+        elif event == "response":
+            self.set_progress(0.7, f"Попытка {attempt}: ответ получен", attempt)
+        elif event == "code":
+            self.set_progress(0.75, f"Попытка {attempt}: рендер схемы...", attempt)
+        elif event == "render_error":
+            self.set_progress(0.05, f"Попытка {attempt} не удалась, исправление кода...", attempt + 1)
+        elif event == "done":
+            self.set_progress(1, f"Готово (попыток: {info['attempts']})")
+        elif event == "failed":
+            self.set_progress(0, "Ошибка генерации")
+        elif event == "cancelled":
+            self.set_progress(0, "Генерация отменена")
+
+    def poll_generation_events(self):
+        try:
+            while True:
+                job_id, event, info = self.generation.events.get_nowait()
+                self.on_generation_event(job_id, event, info)
+        except queue.Empty:
+            pass
+        self.after(100, self.poll_generation_events)
+
+    def on_generation_event(self, job_id, event, info):
+        if job_id == self.current_job_id:
+            self.update_progress(event, info)
+        if event == "started":
+            print(f"Отправка запроса ChatGPT (задача {job_id})...")
+        elif event == "response":
+            print(f"Ответ получен (попытка {info['attempt']}).")
+        elif event == "code":
+            print("Извлечён код PlantUML.")
+            print("Генерация схемы...")
+        elif event == "render_error":
+            if job_id == self.current_job_id:
+                self.failed_attempts = info["failed_attempts"]
+                self.fail_label_var.set(f"Неудачных попыток: {self.failed_attempts}")
+            print(f"Ошибка PlantUML (строка {info['line']}): {info['error']}")
+            print("Попытка исправить код с помощью GPT...")
+        elif event == "done":
+            print(f"Схема успешно сгенерирована: {info['filename']} "
+                  f"(попыток: {info['attempts']}, токенов в запросах: {info['prompt_tokens']})")
+            print("Схема и код сохранены в базе данных.")
+            self.scheme_list.insert(info["scheme_id"], info["filename"])
+            if info["image_format"] == "png":
+                self.thumbnails.enqueue(info["image_id"])
+            if job_id == self.current_job_id:
+                if info["image_format"] == "svg":
+                    self.show_preview_image(info["image_id"])
+                else:
+                    self.preview_key = None
+                    self.show_preview_data(info["image_data"])
+        elif event == "failed":
+            print(f"Ошибка: {info['error']}")
+        elif event == "cancelled":
+            print(f"Генерация отменена (задача {job_id}).")
+
+        if event in ("done", "failed", "cancelled"):
+            self.pending_jobs.discard(job_id)
+            self.update_generation_state()
+        if event == "done":
+            messagebox.showinfo("Генерация завершена", f"Схема успешно сохранена в базе данных:\n{info['filename']}")
+        elif event == "failed":
+            title = "Ошибка PlantUML" if info["kind"] == "plantuml" else "Ошибка"
+            messagebox.showerror(title, info["error"])
+
+    def show_preview_data(self, image_data):
+        self.safe_show_preview(BytesIO(image_data))
+
+    def show_preview_image(self, image_id):
+        width, height = self.preview_label.winfo_width(), self.preview_label.winfo_height()
+        key = (image_id, width, height)
+        self.preview_key = key
+        photo = self.preview_cache.get(key)
+        if photo is not None:
+            self.imgtk = photo
+            self.preview_label.configure(image=photo, text="")
+            return
+        if self.db.image_format(image_id) == "svg":
+            if not rasterizer_available():
+                self.preview_label.configure(image="", text=RASTERIZER_UNAVAILABLE)
                 return
+            # SVG растеризуется в фоне ровно под размер области превью; результат придёт в poll_rasterized.
+            self.preview_label.configure(image="", text="Отрисовка SVG...")
+            self.rasterizer.request(image_id, width, height)
+            return
+        try:
+            # Берём наименьшую миниатюру, которой хватает на область превью,
+            # полноразмерный PNG декодируем только если миниатюр ещё нет.
+            sizes = self.db.get_thumbnail_sizes(image_id)
+            size = pick_thumbnail(sizes, width, height)
+            if size is not None:
+                photo = self.safe_show_preview(BytesIO(self.db.get_thumbnail(image_id, size)))
+            else:
+                # Миниатюры могут уже быть, но все меньше области превью — тогда не перестраиваем их.
+                if not sizes:
+                    self.thumbnails.enqueue(image_id)
+                with self.db.open_image(image_id) as blob:
+                    photo = self.safe_show_preview(blob)
+        except Exception as e:
+            self.preview_label.configure(image="", text=f"Ошибка загрузки изображения:\n{e}")
+            return
+        if photo is not None:
+            self.preview_cache.put(key, photo)
 
-            except RuntimeError as e:
-                err_text = str(e)
-                if "Some diagram description contains errors" in err_text or "diagram description contains errors" in err_text.lower():
-                    self.failed_attempts += 1
-                    self.after(0, lambda: self.fail_label_var.set(f"Неудачных попыток: {self.failed_attemps}"))
-                    self.after(0, lambda: print(f"Ошибка PlantUML: {err_text}"))
-                    self.after(0, lambda: print("Попытка исправить код с помощью GPT..."))
-                    current_prompt = (
-                        current_prompt
-                        + "\n\nКод PlantUML содержит ошибки. Пожалуйста, исправь и выведи корректный, рабочий код."
-                    )
-                    time.sleep(1)
+    def poll_rasterized(self):
+        try:
+            while True:
+                key, img, error = self.rasterizer.results.get_nowait()
+                # PhotoImage создаётся только в главном потоке.
+                photo = None
+                if img is not None:
+                    from PIL import ImageTk
+                    photo = ImageTk.PhotoImage(img)
+                    self.preview_cache.put(key, photo)
+                if key != self.preview_key:
                     continue
+                if photo is not None:
+                    self.imgtk = photo
+                    self.preview_label.configure(image=photo, text="")
                 else:
-                    self.after(0, lambda: print(f"Ошибка PlantUML: {err_text}"))
-                    self.after(0, lambda: messagebox.showerror("Ошибка PlantUML", err_text))
-                    break
-            except Exception as e:
-                self.after(0, lambda: print(f"Ошибка: {e}"))
-                self.after(0, lambda: messagebox.showerror("Ошибка", str(e)))
-                break
-        self.after(0, lambda: self.progress.stop())
-        self.after(0, lambda: self.gen_button.configure(state="normal"))
-
-    def safe_show_preview(self, image_path):
-        if not os.path.isfile(image_path):
+                    self.preview_label.configure(image="", text=f"Ошибка загрузки изображения:\n{error}")
+        except queue.Empty:
+            pass
+        self.after(RASTER_POLL_MS, self.poll_rasterized)
+
+    def safe_show_preview(self, image_source):
+        if not image_source or (isinstance(image_source, str) and not os.path.isfile(image_source)):
             self.preview_label.configure(image="", text="Изображение не найдено")
             return
         try:
-            img = Image.open(image_path)
+            # Pillow нужен только для превью и не задерживает запуск.
+            from PIL import Image, ImageTk
+            img = Image.open(image_source)
             img.thumbnail((self.preview_label.winfo_width(), self.preview_label.winfo_height()), Image.Resampling.LANCZOS)
             self.imgtk = ImageTk.PhotoImage(img)
             self.preview_label.configure(image=self.imgtk, text="")
+            return self.imgtk
         except Exception as e:
             self.preview_label.configure(image="", text=f"Ошибка загрузки изображения:\n{e}")
 
     def on_closing(self):
+        self.methodologies.stop_watching()
+        self.generation.shutdown()
+        shutdown_render_servers()
+        telemetry.detach()
         self.db.close()
         self.save_config()
         self.destroy()
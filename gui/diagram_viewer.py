@@ -0,0 +1,172 @@
+import customtkinter as ctk
+import math
+
+from utils.lru import LRUCache
+from utils.tiles import TileLoader
+
+MIN_ZOOM = 0.01
+MAX_ZOOM = 4.0
+ZOOM_STEP = 1.25
+TILE_POLL_MS = 30
+# Кэш хранит столько тайлов, сколько помещается на несколько экранов: память не зависит от размера схемы.
+TILE_CACHE_SCREENS = 3
+TILE_CACHE_MIN = 32
+
+
+class DiagramViewer(ctk.CTkToplevel):
+    def __init__(self, master, db, image_id, title):
+        super().__init__(master)
+        self.title(f"Просмотр схемы: {title}")
+        self.geometry("1000x750")
+        self.image_id = image_id
+        self.loader = TileLoader(db)
+        self.tile_cache = LRUCache(TILE_CACHE_MIN)
+        self.tile_set = None
+        self.zoom = 1.0
+        self.offset_x = 0
+        self.offset_y = 0
+        self.drag_start = None
+        self.drawn = []
+        self.closed = False
+
+        toolbar = ctk.CTkFrame(self)
+        toolbar.pack(fill="x", padx=5, pady=5)
+        ctk.CTkButton(toolbar, text="−", width=40, command=lambda: self.zoom_by(1 / ZOOM_STEP)).pack(side="left", padx=2)
+        ctk.CTkButton(toolbar, text="+", width=40, command=lambda: self.zoom_by(ZOOM_STEP)).pack(side="left", padx=2)
+        ctk.CTkButton(toolbar, text="Вписать", width=80, command=self.fit).pack(side="left", padx=2)
+        ctk.CTkButton(toolbar, text="100%", width=60, command=lambda: self.set_zoom(1.0)).pack(side="left", padx=2)
+        self.status_var = ctk.StringVar(value="Подготовка тайлов...")
+        ctk.CTkLabel(toolbar, textvariable=self.status_var).pack(side="left", padx=10)
+
+        self.canvas = ctk.CTkCanvas(self, bg="gray20", highlightthickness=0)
+        self.canvas.pack(fill="both", expand=True)
+        self.canvas.bind("<Configure>", lambda event: self.redraw())
+        self.canvas.bind("<ButtonPress-1>", self.on_drag_start)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+        self.canvas.bind("<MouseWheel>", self.on_wheel)
+        self.canvas.bind("<Button-4>", self.on_wheel)
+        self.canvas.bind("<Button-5>", self.on_wheel)
+        self.bind("<plus>", lambda event: self.zoom_by(ZOOM_STEP))
+        self.bind("<equal>", lambda event: self.zoom_by(ZOOM_STEP))
+        self.bind("<minus>", lambda event: self.zoom_by(1 / ZOOM_STEP))
+        self.bind("<Key-0>", lambda event: self.fit())
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Пирамида тайлов строится в фоне при первом открытии изображения и сохраняется в базе.
+        self.loader.prepare(image_id)
+        self.after(TILE_POLL_MS, self.poll_tiles)
+
+    def on_close(self):
+        self.closed = True
+        self.loader.close()
+        self.destroy()
+
+    def poll_tiles(self):
+        if self.closed:
+            return
+        redraw = False
+        while not self.loader.results.empty():
+            kind, key, value = self.loader.results.get_nowait()
+            if kind == "ready":
+                self.tile_set = value
+                self.fit()
+            elif kind == "error":
+                self.status_var.set(f"Ошибка загрузки изображения: {value}")
+            else:
+                # PhotoImage создаётся только в главном потоке.
+                from PIL import ImageTk
+                self.tile_cache.put(key, ImageTk.PhotoImage(value))
+                redraw = redraw or key in self.loader.wanted
+        if redraw:
+            self.redraw()
+        self.after(TILE_POLL_MS, self.poll_tiles)
+
+    def fit(self):
+        if self.tile_set is None:
+            return
+        _, width, height, _ = self.tile_set
+        canvas_w, canvas_h = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if canvas_w <= 1 or canvas_h <= 1:
+            # Окно ещё не отрисовано — размеры холста неизвестны.
+            self.after(TILE_POLL_MS, self.fit)
+            return
+        self.zoom = max(MIN_ZOOM, min(1.0, canvas_w / width, canvas_h / height))
+        self.offset_x = (canvas_w - round(width * self.zoom)) // 2
+        self.offset_y = (canvas_h - round(height * self.zoom)) // 2
+        self.redraw()
+
+    def set_zoom(self, zoom, x=None, y=None):
+        if self.tile_set is None:
+            return
+        zoom = max(MIN_ZOOM, min(MAX_ZOOM, zoom))
+        if x is None:
+            x, y = self.canvas.winfo_width() // 2, self.canvas.winfo_height() // 2
+        # Точка под курсором остаётся на месте.
+        self.offset_x = round(x - (x - self.offset_x) * zoom / self.zoom)
+        self.offset_y = round(y - (y - self.offset_y) * zoom / self.zoom)
+        self.zoom = zoom
+        self.redraw()
+
+    def zoom_by(self, factor, x=None, y=None):
+        self.set_zoom(self.zoom * factor, x, y)
+
+    def on_wheel(self, event):
+        zoom_in = event.num == 4 or getattr(event, "delta", 0) > 0
+        self.zoom_by(ZOOM_STEP if zoom_in else 1 / ZOOM_STEP, event.x, event.y)
+
+    def on_drag_start(self, event):
+        self.drag_start = (event.x, event.y)
+
+    def on_drag(self, event):
+        if self.drag_start is None:
+            return
+        self.offset_x += event.x - self.drag_start[0]
+        self.offset_y += event.y - self.drag_start[1]
+        self.drag_start = (event.x, event.y)
+        self.redraw()
+
+    def visible_tiles(self):
+        tile_size, width, height, levels = self.tile_set
+        # Берём уровень, тайлы которого не меньше экранных: масштаб внутри уровня от 0.5 до 1.
+        level = min(levels - 1, max(0, int(math.floor(math.log2(1 / self.zoom))))) if self.zoom < 1 else 0
+        span = tile_size << level
+        canvas_w, canvas_h = self.canvas.winfo_width(), self.canvas.winfo_height()
+        # Видимая область в координатах исходного изображения.
+        left = max(0, (-self.offset_x) / self.zoom)
+        top = max(0, (-self.offset_y) / self.zoom)
+        right = min(width, (canvas_w - self.offset_x) / self.zoom)
+        bottom = min(height, (canvas_h - self.offset_y) / self.zoom)
+        tiles = []
+        if right <= left or bottom <= top:
+            return tiles
+        for row in range(int(top // span), int(math.ceil(bottom / span))):
+            for col in range(int(left // span), int(math.ceil(right / span))):
+                # Края тайла округляются от начала изображения, а не окна: при прокрутке ключи не меняются.
+                x0, x1 = round(col * span * self.zoom), round(min(width, (col + 1) * span) * self.zoom)
+                y0, y1 = round(row * span * self.zoom), round(min(height, (row + 1) * span) * self.zoom)
+                if x1 > x0 and y1 > y0:
+                    tiles.append(((self.image_id, level, col, row, x1 - x0, y1 - y0), x0, y0))
+        return tiles
+
+    def redraw(self):
+        if self.tile_set is None:
+            return
+        tiles = self.visible_tiles()
+        self.loader.wanted = frozenset(key for key, _, _ in tiles)
+        self.tile_cache.maxsize = max(TILE_CACHE_MIN, TILE_CACHE_SCREENS * len(tiles))
+        self.canvas.delete("tile")
+        self.drawn = []
+        missing = 0
+        for key, x, y in tiles:
+            photo = self.tile_cache.get(key)
+            if photo is None:
+                self.loader.request(key)
+                missing += 1
+                continue
+            self.drawn.append(photo)
+            self.canvas.create_image(self.offset_x + x, self.offset_y + y, image=photo, anchor="nw", tags="tile")
+        _, width, height, _ = self.tile_set
+        status = f"{width}×{height} px, масштаб {self.zoom * 100:.0f}%"
+        if missing:
+            status += f", загрузка тайлов: {missing}"
+        self.status_var.set(status)
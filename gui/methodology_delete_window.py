@@ -1,14 +1,13 @@
 import tkinter as tk
 import customtkinter as ctk
 from tkinter import messagebox
-import os
 
 class MethodologyDeleteWindow(ctk.CTkToplevel):
-    def __init__(self, master, methodologies_dir, refresh_callback):
+    def __init__(self, master, methodologies, refresh_callback):
         super().__init__(master)
         self.title("Удалить методологии")
         self.geometry("400x400")
-        self.methodologies_dir = methodologies_dir
+        self.methodologies = methodologies
         self.refresh_callback = refresh_callback
 
         frame = ctk.CTkFrame(self)
@@ -28,26 +27,18 @@ class MethodologyDeleteWindow(ctk.CTkToplevel):
 
     def load_methodologies(self):
         self.listbox.delete(0, tk.END)
-        try:
-            files = [f for f in os.listdir(self.methodologies_dir) if f.endswith(".txt")]
-        except Exception:
-            files = []
-        for f in files:
-            self.listbox.insert(tk.END, f)
+        names = self.methodologies.names()
+        if names:
+            self.listbox.insert(tk.END, *names)
 
     def delete_selected(self):
         selected = list(self.listbox.curselection())
         if not selected:
             messagebox.showwarning("Внимание", "Выберите методологии для удаления.")
             return
-        selected_files = [self.listbox.get(i) for i in selected]
-        if messagebox.askyesno("Подтверждение", f"Удалить выбранные методологии?\n{', '.join(selected_files)}"):
-            errors = []
-            for f in selected_files:
-                try:
-                    os.remove(os.path.join(self.methodologies_dir, f))
-                except Exception as e:
-                    errors.append(f"{f}: {e}")
+        selected_names = [self.listbox.get(i) for i in selected]
+        if messagebox.askyesno("Подтверждение", f"Удалить выбранные методологии?\n{', '.join(selected_names)}"):
+            errors = self.methodologies.delete(selected_names)
             if errors:
                 messagebox.showerror("Ошибка", "Ошибки при удалении:\n" + "\n".join(errors))
             else:
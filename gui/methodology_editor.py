@@ -1,15 +1,14 @@
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import messagebox
-import os
 from utils.text_utils import bind_ctrl_v
 
 class MethodologyEditor(ctk.CTkToplevel):
-    def __init__(self, master, methodologies_dir, refresh_callback):
+    def __init__(self, master, methodologies, refresh_callback):
         super().__init__(master)
         self.title("Добавить методологию")
         self.geometry("600x400")
-        self.methodologies_dir = methodologies_dir
+        self.methodologies = methodologies
         self.refresh_callback = refresh_callback
 
         frame = ctk.CTkFrame(self)
@@ -43,11 +42,8 @@ class MethodologyEditor(ctk.CTkToplevel):
         if not desc:
             messagebox.showerror("Ошибка", "Введите описание методологии")
             return
-        os.makedirs(self.methodologies_dir, exist_ok=True)
-        file_path = os.path.join(self.methodologies_dir, safe_name + ".txt")
         try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(desc)
+            self.methodologies.save(safe_name, desc)
             messagebox.showinfo("Успех", f"Методология '{safe_name}' сохранена")
             self.refresh_callback()
             self.destroy()
@@ -0,0 +1,109 @@
+import tkinter as tk
+
+PAGE_SIZE = 200
+PREFETCH_THRESHOLD = 0.9
+
+
+class SchemeList:
+    def __init__(self, master, db, page_size=PAGE_SIZE, **listbox_options):
+        self.db = db
+        self.page_size = page_size
+        self.ids = []
+        self.names = []
+        # Пока первая страница не загружена, прокрутка пустого списка не должна подгружать строки.
+        self.exhausted = True
+        self.query = ""
+        self._loading = False
+        self._scrollbar = None
+        self.listbox = tk.Listbox(master, **listbox_options)
+        self.listbox.config(yscrollcommand=self._on_scroll)
+
+    def attach_scrollbar(self, scrollbar):
+        self._scrollbar = scrollbar
+        scrollbar.configure(command=self.listbox.yview)
+
+    def _on_scroll(self, first, last):
+        if self._scrollbar is not None:
+            self._scrollbar.set(first, last)
+        # Следующую страницу подгружаем, когда пользователь докрутил почти до конца.
+        if float(last) >= PREFETCH_THRESHOLD and not self.exhausted and not self._loading:
+            self._loading = True
+            self.listbox.after_idle(self.load_more)
+
+    @staticmethod
+    def _label(scheme_id, filename):
+        return f"{scheme_id}: {filename}"
+
+    def set_query(self, query):
+        query = query.strip()
+        if query != self.query:
+            self.query = query
+            self.reload()
+
+    def reload(self):
+        self._clear()
+        self.load_more()
+
+    def _clear(self):
+        self.listbox.delete(0, tk.END)
+        self.ids = []
+        self.names = []
+        self.exhausted = False
+
+    def show_first_page(self, rows):
+        # Первая страница, прочитанная в фоне при запуске. Если пользователь
+        # уже начал поиск, выдача загружена; если список изменился, страница устарела.
+        if self.query:
+            return
+        if self.ids:
+            self.reload()
+            return
+        self._clear()
+        self._append(rows)
+
+    def load_more(self):
+        self._loading = False
+        if self.exhausted:
+            return
+        before_id = self.ids[-1] if self.ids else None
+        if self.query:
+            rows = self.db.search_schemes(self.query, before_id, self.page_size)
+        else:
+            rows = self.db.get_schemes_page(before_id, self.page_size)
+        self._append(rows)
+
+    def _append(self, rows):
+        if len(rows) < self.page_size:
+            self.exhausted = True
+        if rows:
+            self.listbox.insert(tk.END, *(self._label(sid, fname) for sid, fname in rows))
+            self.ids.extend(sid for sid, _ in rows)
+            self.names.extend(fname for _, fname in rows)
+
+    def selected_id(self):
+        sel = self.listbox.curselection()
+        if not sel:
+            return None
+        return self.ids[sel[0]]
+
+    def insert(self, scheme_id, filename):
+        if self.query:
+            # Подходит ли новая схема под фильтр, решает индекс: перечитываем выдачу.
+            self.reload()
+            return
+        # Повторное сохранение под тем же именем даёт схеме новый id: убираем старую строку.
+        if filename in self.names:
+            self._remove_index(self.names.index(filename))
+        # Новые id всегда больше загруженных, поэтому строка встаёт в начало списка.
+        self.ids.insert(0, scheme_id)
+        self.names.insert(0, filename)
+        self.listbox.insert(0, self._label(scheme_id, filename))
+
+    def remove(self, scheme_id):
+        if scheme_id in self.ids:
+            self._remove_index(self.ids.index(scheme_id))
+
+    def _remove_index(self, index):
+        del self.ids[index]
+        del self.names[index]
+        self.listbox.delete(index)
@@ -7,18 +7,21 @@ from pathlib import Path
 
 from utils.text_utils import bind_ctrl_v as bind_ctrl_v
 from utils.dirs import IMAGES_DIR, PLANTUML_JAR_PATH, PLANTUML_DIR, PLANTUML_DOWNLOAD_URL
+from utils.prompt import DEFAULT_PROMPT_TOKEN_BUDGET
+from utils.plantuml import OUTPUT_FORMATS, DEFAULT_OUTPUT_FORMAT, output_format_from_config
+from utils.plantuml_server import shutdown_render_servers
 from gui.methodology_editor import MethodologyEditor
 from gui.methodology_delete_window import MethodologyDeleteWindow
 
 class SettingsWindow(ctk.CTkToplevel):
-    def __init__(self, master, config_data, save_callback, methodologies_dir, load_methodologies_callback):
+    def __init__(self, master, config_data, save_callback, methodologies, load_methodologies_callback):
         super().__init__(master)
         self.title("Настройки")
-        self.geometry("800x650")
+        self.geometry("920x700")
         self.resizable(False, False)
         self.config_data = config_data
         self.save_callback = save_callback
-        self.methodologies_dir = methodologies_dir
+        self.methodologies = methodologies
         self.load_methodologies_callback = load_methodologies_callback
 
         self.download_progress_var = ctk.StringVar(value="")
@@ -69,17 +72,44 @@ class SettingsWindow(ctk.CTkToplevel):
         self.dir_entry = ctk.CTkEntry(frame, textvariable=self.dir_var, width=400)
         self.dir_entry.grid(row=3, column=1, sticky="ew", padx=5, pady=10)
         ctk.CTkButton(frame, text="Выбрать...", command=self.choose_dir).grid(row=3, column=2, padx=5, pady=10)
+        format_frame = ctk.CTkFrame(frame, fg_color="transparent")
+        format_frame.grid(row=3, column=3, padx=5, pady=10)
+        ctk.CTkLabel(format_frame, text="Формат:").pack(side="left", padx=(0, 5))
+        self.output_format_var = ctk.StringVar(value=output_format_from_config(self.config_data).upper())
+        ctk.CTkSegmentedButton(
+            format_frame, values=[f.upper() for f in OUTPUT_FORMATS], variable=self.output_format_var
+        ).pack(side="left")
 
-        # Improve prompt checkbox
+        # Improve prompt checkbox and LLM response cache options
+        options_frame = ctk.CTkFrame(frame, fg_color="transparent")
+        options_frame.grid(row=4, column=0, columnspan=4, sticky="w")
         self.improve_prompt_var = ctk.BooleanVar(value=self.config_data.get("improve_prompt", False))
-        self.improve_cb = ctk.CTkCheckBox(frame, text="Улучшить промт", variable=self.improve_prompt_var)
-        self.improve_cb.grid(row=4, column=0, columnspan=4, sticky="w")
+        self.improve_cb = ctk.CTkCheckBox(options_frame, text="Улучшить промт", variable=self.improve_prompt_var)
+        self.improve_cb.pack(side="left")
+        self.llm_cache_bypass_var = ctk.BooleanVar(value=self.config_data.get("llm_cache_bypass", False))
+        self.llm_cache_bypass_cb = ctk.CTkCheckBox(options_frame, text="Не использовать кэш ответов GPT", variable=self.llm_cache_bypass_var)
+        self.llm_cache_bypass_cb.pack(side="left", padx=20)
+        ctk.CTkLabel(options_frame, text="Срок хранения кэша (ч):").pack(side="left")
+        self.llm_cache_ttl_var = ctk.StringVar(value=str(self.config_data.get("llm_cache_ttl_hours", 168)))
+        ctk.CTkEntry(options_frame, textvariable=self.llm_cache_ttl_var, width=60).pack(side="left", padx=5)
 
-        # Max retries
+        # Max retries, parallel candidates and deadline
         ctk.CTkLabel(frame, text="Макс. попыток генерации схемы:").grid(row=5, column=0, sticky="w", pady=10)
+        limits_frame = ctk.CTkFrame(frame, fg_color="transparent")
+        limits_frame.grid(row=5, column=1, columnspan=3, sticky="w", padx=5, pady=10)
         self.max_retries_var = ctk.StringVar(value=str(self.config_data.get("max_retries", 5)))
-        self.max_retries_entry = ctk.CTkEntry(frame, textvariable=self.max_retries_var, width=60)
-        self.max_retries_entry.grid(row=5, column=1, sticky="w", padx=5, pady=10)
+        self.max_retries_entry = ctk.CTkEntry(limits_frame, textvariable=self.max_retries_var, width=60)
+        self.max_retries_entry.pack(side="left")
+        ctk.CTkLabel(limits_frame, text="Вариантов за попытку:").pack(side="left", padx=(20, 5))
+        self.candidates_var = ctk.StringVar(value=str(self.config_data.get("candidates", 1)))
+        ctk.CTkEntry(limits_frame, textvariable=self.candidates_var, width=50).pack(side="left")
+        ctk.CTkLabel(limits_frame, text="Лимит времени (с, 0 — нет):").pack(side="left", padx=(20, 5))
+        self.deadline_var = ctk.StringVar(value=str(self.config_data.get("generation_deadline", 0)))
+        ctk.CTkEntry(limits_frame, textvariable=self.deadline_var, width=60).pack(side="left")
+        ctk.CTkLabel(limits_frame, text="Бюджет токенов промта (0 — нет):").pack(side="left", padx=(20, 5))
+        self.token_budget_var = ctk.StringVar(
+            value=str(self.config_data.get("prompt_token_budget", DEFAULT_PROMPT_TOKEN_BUDGET)))
+        ctk.CTkEntry(limits_frame, textvariable=self.token_budget_var, width=60).pack(side="left")
 
         # Prompt improvements inputs
         ctk.CTkLabel(frame, text="Промт для улучшения (часть 1):").grid(row=6, column=0, sticky="nw", pady=(20,5))
@@ -102,9 +132,17 @@ class SettingsWindow(ctk.CTkToplevel):
         ctk.CTkButton(btn_meth_frame, text="Очистить папку с изображениями", command=self.clear_images).pack(side="left", padx=10)
         ctk.CTkButton(btn_meth_frame, text="Сбросить настройки", command=self.reset_settings).pack(side="left", padx=10)
 
+        # Render cache statistics
+        cache_frame = ctk.CTkFrame(frame)
+        cache_frame.grid(row=9, column=0, columnspan=4, sticky="ew")
+        self.cache_stats_var = ctk.StringVar(value="")
+        ctk.CTkLabel(cache_frame, textvariable=self.cache_stats_var).pack(side="left", padx=10)
+        ctk.CTkButton(cache_frame, text="Очистить кэш рендера", command=self.clear_render_cache).pack(side="right", padx=10)
+        self.update_cache_stats()
+
         # Save/Cancel buttons
         btn_frame = ctk.CTkFrame(frame)
-        btn_frame.grid(row=9, column=0, columnspan=4, pady=20)
+        btn_frame.grid(row=10, column=0, columnspan=4, pady=20)
         ctk.CTkButton(btn_frame, text="Сохранить", command=self.on_save).pack(side="left", padx=10)
         ctk.CTkButton(btn_frame, text="Отмена", command=self.destroy).pack(side="left", padx=10)
 
@@ -122,6 +160,23 @@ class SettingsWindow(ctk.CTkToplevel):
         theme = self.theme_var.get()
         self.theme_label.configure(text="Тёмная тема" if theme == "dark" else "Светлая тема")
 
+    def update_cache_stats(self):
+        cache = getattr(self.master, "render_cache", None)
+        if cache is None:
+            self.cache_stats_var.set("Кэш рендера недоступен")
+            return
+        stats = cache.stats()
+        self.cache_stats_var.set(
+            f"Кэш рендера: {stats['entries']} схем, {stats['size_bytes'] / 1024 / 1024:.1f} из "
+            f"{stats['limit_bytes'] / 1024 / 1024:.0f} МБ, попаданий {stats['hits']}, промахов {stats['misses']}"
+        )
+
+    def clear_render_cache(self):
+        cache = getattr(self.master, "render_cache", None)
+        if cache is not None:
+            cache.clear()
+        self.update_cache_stats()
+
     def choose_jar(self):
         path = filedialog.askopenfilename(title="Выберите plantuml.jar", filetypes=[("JAR files", "*.jar")])
         if path:
@@ -137,10 +192,10 @@ class SettingsWindow(ctk.CTkToplevel):
             self.save_callback(self.config_data)
 
     def open_methodology_editor(self):
-        MethodologyEditor(self, self.methodologies_dir, self.load_methodologies_callback)
+        MethodologyEditor(self, self.methodologies, self.load_methodologies_callback)
 
     def open_methodology_delete(self):
-        MethodologyDeleteWindow(self, self.methodologies_dir, self.load_methodologies_callback)
+        MethodologyDeleteWindow(self, self.methodologies, self.load_methodologies_callback)
 
     def clear_images(self):
         if messagebox.askyesno("Подтверждение", "Очистить папку с изображениями? Все файлы будут удалены."):
@@ -155,6 +210,8 @@ class SettingsWindow(ctk.CTkToplevel):
 
     def download_plantuml(self):
         try:
+            # Запущенные JVM держат старый jar открытым (на Windows его нельзя перезаписать).
+            shutdown_render_servers()
             for f in os.listdir(PLANTUML_DIR):
                 file_path = os.path.join(PLANTUML_DIR, f)
                 try:
@@ -198,8 +255,19 @@ class SettingsWindow(ctk.CTkToplevel):
         default_config = {
             "jar_path": str(PLANTUML_JAR_PATH),
             "output_dir": str(IMAGES_DIR),
+            "output_format": DEFAULT_OUTPUT_FORMAT,
             "improve_prompt": False,
             "max_retries": 5,
+            "candidates": 1,
+            "generation_deadline": 0,
+            "prompt_token_budget": DEFAULT_PROMPT_TOKEN_BUDGET,
+            "render_workers": 2,
+            "lint_plantuml": True,
+            "render_cache_mb": 64,
+            "llm_cache_bypass": False,
+            "llm_cache_ttl_hours": 168,
+            "llm_backend": "g4f",
+            "llm_model": "gpt-4o",
             "prompt_improve_1": "",
             "prompt_improve_2": "",
             "theme": "dark"
@@ -210,8 +278,14 @@ class SettingsWindow(ctk.CTkToplevel):
 
         self.jar_path_var.set(self.config_data["jar_path"])
         self.dir_var.set(self.config_data["output_dir"])
+        self.output_format_var.set(self.config_data["output_format"].upper())
         self.improve_prompt_var.set(self.config_data["improve_prompt"])
+        self.llm_cache_bypass_var.set(self.config_data["llm_cache_bypass"])
+        self.llm_cache_ttl_var.set(str(self.config_data["llm_cache_ttl_hours"]))
         self.max_retries_var.set(str(self.config_data["max_retries"]))
+        self.candidates_var.set(str(self.config_data["candidates"]))
+        self.deadline_var.set(str(self.config_data["generation_deadline"]))
+        self.token_budget_var.set(str(self.config_data["prompt_token_budget"]))
         self.prompt_improve_1.delete("0.0", "end")
         self.prompt_improve_1.insert("0.0", self.config_data["prompt_improve_1"])
         self.prompt_improve_2.delete("0.0", "end")
@@ -225,11 +299,29 @@ class SettingsWindow(ctk.CTkToplevel):
     def on_save(self):
         self.config_data["jar_path"] = self.jar_path_var.get()
         self.config_data["output_dir"] = self.dir_var.get()
+        self.config_data["output_format"] = self.output_format_var.get().lower()
         self.config_data["improve_prompt"] = self.improve_prompt_var.get()
+        self.config_data["llm_cache_bypass"] = self.llm_cache_bypass_var.get()
+        try:
+            self.config_data["llm_cache_ttl_hours"] = float(self.llm_cache_ttl_var.get())
+        except Exception:
+            self.config_data["llm_cache_ttl_hours"] = 168
         try:
             self.config_data["max_retries"] = int(self.max_retries_var.get())
         except Exception:
             self.config_data["max_retries"] = 5
+        try:
+            self.config_data["candidates"] = max(1, int(self.candidates_var.get()))
+        except Exception:
+            self.config_data["candidates"] = 1
+        try:
+            self.config_data["generation_deadline"] = max(0.0, float(self.deadline_var.get()))
+        except Exception:
+            self.config_data["generation_deadline"] = 0
+        try:
+            self.config_data["prompt_token_budget"] = max(0, int(self.token_budget_var.get()))
+        except Exception:
+            self.config_data["prompt_token_budget"] = DEFAULT_PROMPT_TOKEN_BUDGET
         self.config_data["prompt_improve_1"] = self.prompt_improve_1.get("0.0", "end").strip()
         self.config_data["prompt_improve_2"] = self.prompt_improve_2.get("0.0", "end").strip()
         self.config_data["theme"] = self.theme_var.get()
@@ -0,0 +1,106 @@
+import customtkinter as ctk
+from tkinter import filedialog, messagebox
+
+from utils.telemetry import summarize, export_json, clear_metrics
+
+STAGE_NAMES = {
+    "generation": "Генерация целиком",
+    "llm": "Запрос к LLM",
+    "extract": "Извлечение кода",
+    "lint": "Проверка структуры",
+    "render_cache": "Кэш рендера",
+    "render_cold": "Рендер с запуском JVM",
+    "render": "Рендер PlantUML",
+    "file_write": "Запись файла",
+    "db_write": "Запись в БД",
+    "db_read_image": "Чтение изображения",
+    "db_delete": "Удаление из БД",
+    "preview": "Показ превью",
+    "export": "Экспорт",
+}
+HISTOGRAM_WIDTH = 40
+
+
+class StatsWindow(ctk.CTkToplevel):
+    def __init__(self, master, db):
+        super().__init__(master)
+        self.title("Статистика генерации")
+        self.geometry("760x620")
+        self.db = db
+
+        self.text = ctk.CTkTextbox(self, font=("Consolas", 12))
+        self.text.pack(fill="both", expand=True, padx=10, pady=(10, 5))
+
+        btn_frame = ctk.CTkFrame(self)
+        btn_frame.pack(fill="x", padx=10, pady=(0, 10))
+        ctk.CTkButton(btn_frame, text="Обновить", command=self.refresh).pack(side="left", padx=5)
+        ctk.CTkButton(btn_frame, text="Экспорт в JSON", command=self.export).pack(side="left", padx=5)
+        ctk.CTkButton(btn_frame, text="Очистить метрики", fg_color="#cc3300", hover_color="#ff4d4d",
+                      command=self.clear).pack(side="right", padx=5)
+
+        self.refresh()
+
+    def refresh(self):
+        try:
+            summary = summarize(self.db)
+        except Exception as e:
+            summary = None
+            report = f"Не удалось получить статистику: {e}"
+        if summary is not None:
+            report = self.format_summary(summary)
+        self.text.configure(state="normal")
+        self.text.delete("0.0", "end")
+        self.text.insert("0.0", report)
+        self.text.configure(state="disabled")
+
+    def format_summary(self, summary):
+        lines = ["Этапы (мс)", f"{'этап':<26}{'кол-во':>8}{'p50':>10}{'p95':>10}{'макс':>10}"]
+        for stage, row in summary["stages"].items():
+            lines.append(
+                f"{STAGE_NAMES.get(stage, stage):<26}{row['count']:>8}{row['p50_ms']:>10.1f}"
+                f"{row['p95_ms']:>10.1f}{row['max_ms']:>10.1f}"
+            )
+        if not summary["stages"]:
+            lines.append("нет данных")
+
+        lines += ["", "Счётчики"]
+        for name, total in summary["counters"].items():
+            lines.append(f"  {name:<24}{total:>10.0f}")
+        if not summary["counters"]:
+            lines.append("  нет данных")
+
+        lines += ["", "Попыток на схему"]
+        histogram = summary["retry_histogram"]
+        peak = max(histogram.values(), default=0)
+        for attempts, schemes in histogram.items():
+            bar = "#" * max(1, round(schemes / peak * HISTOGRAM_WIDTH))
+            lines.append(f"  {attempts:>3} | {bar} {schemes}")
+        if not histogram:
+            lines.append("  нет данных")
+
+        lines += ["", "Методологии (по среднему числу попыток)"]
+        for row in summary["methodologies"]:
+            lines.append(
+                f"  {row['methodology'][:30]:<32}схем {row['schemes']:>5}  "
+                f"попыток {row['mean_attempts']:>5.2f}  время {row['mean_seconds']:>6.1f} с"
+            )
+        if not summary["methodologies"]:
+            lines.append("  нет данных")
+        return "\n".join(lines)
+
+    def export(self):
+        path = filedialog.asksaveasfilename(
+            parent=self, defaultextension=".json", filetypes=[("JSON", "*.json")], initialfile="plantgpt_metrics.json"
+        )
+        if not path:
+            return
+        try:
+            export_json(self.db, path)
+            messagebox.showinfo("Экспорт завершён", f"Метрики сохранены:\n{path}", parent=self)
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Ошибка при экспорте: {e}", parent=self)
+
+    def clear(self):
+        if messagebox.askyesno("Подтверждение", "Удалить все сохранённые метрики?", parent=self):
+            clear_metrics(self.db)
+            self.refresh()
@@ -1,5 +1,20 @@
-from gui.app import PlantUMLApp
+import sys
 
-if __name__ == "__main__":
-    app = PlantUMLApp()
+from utils import startup
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from utils.batch import main as batch_main
+        return batch_main(sys.argv[2:])
+    if "--profile-startup" in sys.argv[1:]:
+        return startup.profile_startup()
+    from gui.app import PlantUMLApp
+    startup.mark("import gui.app")
+    app = PlantUMLApp(startup_probe=startup.PROBE_FLAG in sys.argv[1:])
     app.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+from db.database import Database
+from db.llm_cache import LLMCache, DEFAULT_LLM_CACHE_TTL_HOURS
+from db.render_cache import RenderCache, DEFAULT_RENDER_CACHE_MB
+from utils.config import load_config
+from utils.dirs import ensure_dirs, DB_PATH, METHODOLOGIES_DIR, PLANTUML_JAR_PATH
+from utils.llm import create_backend
+from utils.methodologies import get_store
+from utils.pipeline import agenerate_scheme, generation_limits, INVALID_FILENAME_CHARS
+from utils.plantuml import set_lint_enabled, output_format_from_config
+from utils.plantuml_server import set_render_workers, shutdown_render_servers, DEFAULT_RENDER_WORKERS
+from utils.prompt import build_prompt
+from utils.telemetry import telemetry, percentile
+
+DEFAULT_LLM_WORKERS = 4
+
+
+def read_spec(path):
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_no}: некорректный JSON: {e}")
+            if not item.get("prompt") or not item.get("filename"):
+                raise ValueError(f"{path}:{line_no}: нужны поля 'prompt' и 'filename'")
+            item["line"] = line_no
+            items.append(item)
+    return items
+
+
+def load_methodology(name, methodologies_dir=METHODOLOGIES_DIR):
+    if not name:
+        return ""
+    # Хранилище общее для всех задач пакета: одинаковые методологии читаются один раз.
+    body = get_store(methodologies_dir).get(name)
+    if body is None:
+        raise FileNotFoundError(f"Методология не найдена: {name}")
+    return body
+
+
+async def run_item(item, config, backend, db, render_cache, jar_path, max_retries):
+    started = time.perf_counter()
+    report = {"filename": item["filename"], "line": item["line"], "ok": False}
+    try:
+        if any(c in item["filename"] for c in INVALID_FILENAME_CHARS):
+            raise ValueError("Имя файла содержит недопустимые символы.")
+        methodology_prompt = load_methodology(item.get("methodology"))
+        prompt = build_prompt(item["prompt"], methodology_prompt, config)
+        candidates, deadline = generation_limits(config)
+        result = await agenerate_scheme(
+            prompt, backend, jar_path, max_retries,
+            render_cache=render_cache, retry_delay=0, candidates=candidates, deadline=deadline,
+            output_format=output_format_from_config(config),
+            all_diagrams=bool(item.get("all_diagrams", config.get("batch_all_diagrams", False))),
+        )
+        db_started = time.perf_counter()
+        duration = time.perf_counter() - started
+        # Дополнительные диаграммы ответа сохраняются рядом: order_flow_2, order_flow_3...
+        diagrams = [(item["filename"], result["code"], result["image_data"])]
+        diagrams += [(f"{item['filename']}_{number}", code, image_data)
+                     for number, (code, image_data) in enumerate(result["extra_diagrams"], 2)]
+        for filename, code, image_data in diagrams:
+            await asyncio.to_thread(
+                db.add_scheme, filename, code, None, image_data,
+                item["prompt"], item.get("methodology"),
+                backend.model, result["attempts"], duration, result["image_format"],
+            )
+        report.update(
+            ok=True,
+            diagrams=len(diagrams),
+            attempts=result["attempts"],
+            failed_attempts=result["failed_attempts"],
+            llm_seconds=round(result["llm_seconds"], 3),
+            render_seconds=round(result["render_seconds"], 3),
+            prompt_tokens=result["prompt_tokens"],
+            response_tokens=result["response_tokens"],
+            attempt_metrics=result["attempt_metrics"],
+            db_seconds=round(time.perf_counter() - db_started, 3),
+        )
+    except Exception as e:
+        report["error"] = str(e)
+    report["total_seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+async def run_batch(items, config, backend, db, render_cache, jar_path, max_retries, llm_workers):
+    semaphore = asyncio.Semaphore(max(1, llm_workers))
+
+    async def guarded(item):
+        async with semaphore:
+            return await run_item(item, config, backend, db, render_cache, jar_path, max_retries)
+
+    reports = []
+    for next_report in asyncio.as_completed([guarded(item) for item in items]):
+        report = await next_report
+        reports.append(report)
+        if report["ok"]:
+            print(
+                f"[ok]   {report['filename']}: попыток {report['attempts']}, "
+                f"LLM {report['llm_seconds']:.2f} с, рендер {report['render_seconds']:.2f} с, "
+                f"всего {report['total_seconds']:.2f} с"
+            )
+        else:
+            print(f"[fail] {report['filename']} (строка {report['line']}): {report['error']}")
+    return reports
+
+
+def summarize(reports, wall_seconds):
+    ok = [r for r in reports if r["ok"]]
+    totals = [r["total_seconds"] for r in ok]
+    return {
+        "items": len(reports),
+        "succeeded": len(ok),
+        "failed": len(reports) - len(ok),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_per_min": round(len(ok) / wall_seconds * 60, 2) if wall_seconds else 0.0,
+        "mean_seconds": round(statistics.mean(totals), 3) if totals else 0.0,
+        "p50_seconds": round(percentile(totals, 50), 3),
+        "p95_seconds": round(percentile(totals, 95), 3),
+        "mean_attempts": round(statistics.mean(r["attempts"] for r in ok), 2) if ok else 0.0,
+        "mean_prompt_tokens": round(statistics.mean(r["prompt_tokens"] for r in ok), 1) if ok else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py batch", description="Пакетная генерация схем PlantUML из JSONL-файла.")
+    parser.add_argument("spec", help="JSONL: по одному объекту {\"prompt\", \"filename\", \"methodology\"} на строку")
+    parser.add_argument("--llm-workers", type=int, default=DEFAULT_LLM_WORKERS, help="одновременных запросов к LLM")
+    parser.add_argument("--render-workers", type=int, default=None, help="одновременных рендеров PlantUML")
+    parser.add_argument("--max-retries", type=int, default=None)
+    parser.add_argument("--candidates", type=int, default=None, help="параллельных вариантов ответа LLM на попытку")
+    parser.add_argument("--deadline", type=float, default=None, help="ограничение времени на одну схему, с")
+    parser.add_argument("--all-diagrams", action="store_true",
+                        help="сохранять все диаграммы из ответа модели, а не только первую")
+    parser.add_argument("--jar", default=None, help="путь к plantuml.jar")
+    parser.add_argument("--db", default=None, help="путь к базе данных схем")
+    parser.add_argument("--report", default=None, help="записать отчёт по элементам и итоги в JSON")
+    args = parser.parse_args(argv)
+
+    ensure_dirs()
+    config = load_config()
+    jar_path = args.jar or config.get("jar_path", str(PLANTUML_JAR_PATH))
+    if not os.path.isfile(jar_path):
+        print(f"plantuml.jar не найден: {jar_path}", file=sys.stderr)
+        return 2
+    try:
+        max_retries = args.max_retries or int(config.get("max_retries", 5))
+    except Exception:
+        max_retries = 5
+    if args.candidates is not None:
+        config["candidates"] = args.candidates
+    if args.deadline is not None:
+        config["generation_deadline"] = args.deadline
+    if args.all_diagrams:
+        config["batch_all_diagrams"] = True
+    try:
+        items = read_spec(args.spec)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    set_render_workers(args.render_workers or config.get("render_workers", DEFAULT_RENDER_WORKERS))
+    set_lint_enabled(config.get("lint_plantuml", True))
+    db = Database(args.db or DB_PATH)
+    render_cache = RenderCache(db, config.get("render_cache_mb", DEFAULT_RENDER_CACHE_MB))
+    llm_cache = LLMCache(db, config.get("llm_cache_ttl_hours", DEFAULT_LLM_CACHE_TTL_HOURS))
+    backend = create_backend(config, llm_cache)
+    telemetry.attach(db)
+
+    started = time.perf_counter()
+    try:
+        reports = asyncio.run(run_batch(items, config, backend, db, render_cache, jar_path, max_retries, args.llm_workers))
+    finally:
+        shutdown_render_servers()
+        telemetry.detach()
+        db.close()
+
+    summary = summarize(reports, time.perf_counter() - started)
+    print(
+        f"Готово: {summary['succeeded']}/{summary['items']} за {summary['wall_seconds']:.1f} с, "
+        f"{summary['throughput_per_min']:.1f} схем/мин, p50 {summary['p50_seconds']:.2f} с, "
+        f"p95 {summary['p95_seconds']:.2f} с, в среднем попыток {summary['mean_attempts']:.2f}, "
+        f"токенов запроса {summary['mean_prompt_tokens']:.0f}"
+    )
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "items": sorted(reports, key=lambda r: r["line"])}, f, ensure_ascii=False, indent=4)
+    return 0 if summary["failed"] == 0 else 1
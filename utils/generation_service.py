@@ -0,0 +1,149 @@
+import asyncio
+import itertools
+import queue
+import threading
+import time
+
+from utils.pipeline import agenerate_scheme
+from utils.plantuml import DEFAULT_OUTPUT_FORMAT
+from utils.telemetry import span, count
+
+DEFAULT_GENERATION_WORKERS = 2
+
+
+class GenerationJob:
+    def __init__(self, prompt, filename, jar_path, max_retries, backend, render_cache=None, candidates=1, deadline=None,
+                 source_prompt=None, methodology=None, output_format=DEFAULT_OUTPUT_FORMAT):
+        self.id = None
+        self.prompt = prompt
+        self.filename = filename
+        self.jar_path = jar_path
+        self.max_retries = max_retries
+        self.backend = backend
+        self.render_cache = render_cache
+        self.candidates = candidates
+        self.deadline = deadline
+        self.source_prompt = source_prompt
+        self.methodology = methodology
+        self.output_format = output_format
+        self.status = "queued"
+        self.task = None
+
+
+class GenerationService:
+    def __init__(self, db, workers=DEFAULT_GENERATION_WORKERS):
+        self.db = db
+        self.workers = max(1, int(workers))
+        self.events = queue.Queue()
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._closing = False
+        self._ready = threading.Event()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self._queue = asyncio.Queue()
+        self._workers = [self.loop.create_task(self._worker()) for _ in range(self.workers)]
+        self.loop.call_soon(self._ready.set)
+        self.loop.run_forever()
+
+    def _emit(self, job, event, **info):
+        self.events.put((job.id, event, info))
+
+    def submit(self, job):
+        job.id = next(self._ids)
+        self.jobs[job.id] = job
+        self._emit(job, "queued")
+        self.loop.call_soon_threadsafe(self._queue.put_nowait, job)
+        return job.id
+
+    def cancel(self, job_id):
+        self.loop.call_soon_threadsafe(self._cancel, job_id)
+
+    def cancel_all(self):
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+
+    def _cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        if job.task is not None:
+            job.task.cancel()
+        elif job.status == "queued":
+            job.status = "cancelled"
+            self.jobs.pop(job_id, None)
+            self._emit(job, "cancelled")
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            if job.status != "queued":
+                continue
+            job.status = "running"
+            job.task = asyncio.create_task(self._process(job))
+            try:
+                await job.task
+            except asyncio.CancelledError:
+                if self._closing or not job.task.cancelled():
+                    raise
+                job.status = "cancelled"
+                self._emit(job, "cancelled")
+            finally:
+                self.jobs.pop(job.id, None)
+
+    async def _process(self, job):
+        self._emit(job, "started")
+        started = time.perf_counter()
+        try:
+            with span("generation", methodology=job.methodology) as attrs:
+                result = await agenerate_scheme(
+                    job.prompt, job.backend, job.jar_path, job.max_retries,
+                    render_cache=job.render_cache,
+                    candidates=job.candidates,
+                    deadline=job.deadline,
+                    output_format=job.output_format,
+                    on_event=lambda event, **info: self._emit(job, event, **info),
+                )
+                attrs["attempts"] = result["attempts"]
+                scheme_id, image_id = await asyncio.to_thread(
+                    self.db.add_scheme, job.filename, result["code"], None, result["image_data"],
+                    job.source_prompt, job.methodology,
+                    job.backend.model, result["attempts"], time.perf_counter() - started,
+                    result["image_format"],
+                )
+        except asyncio.CancelledError:
+            raise
+        except RuntimeError as e:
+            count("generations_failed")
+            job.status = "failed"
+            self._emit(job, "failed", error=str(e), kind="plantuml")
+            return
+        except Exception as e:
+            count("generations_failed")
+            job.status = "failed"
+            self._emit(job, "failed", error=str(e), kind="generic")
+            return
+        job.status = "done"
+        self._emit(
+            job, "done", filename=job.filename, scheme_id=scheme_id,
+            image_data=result["image_data"], image_id=image_id, image_format=result["image_format"],
+            attempts=result["attempts"], prompt_tokens=result["prompt_tokens"],
+        )
+
+    async def _stop(self):
+        self._closing = True
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.loop.stop()
+
+    def shutdown(self):
+        if self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._stop(), self.loop)
+            self._thread.join(timeout=2)
@@ -0,0 +1,301 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
+from utils.plantuml_extract import extract_plantuml_code
+from utils.text_utils import estimate_tokens
+
+DEFAULT_LLM_BACKEND = "g4f"
+DEFAULT_LLM_MODEL = "gpt-4o"
+DEFAULT_STUB_LATENCY = 0.5
+STUB_STREAM_CHUNK = 16
+
+STUB_DIAGRAM = """@startuml
+title {title}
+actor Пользователь
+participant "PlantGPT" as App
+database "SQLite" as DB
+Пользователь -> App: Запрос схемы
+App -> DB: Сохранить схему
+DB --> App: OK
+App --> Пользователь: Превью
+@enduml"""
+
+STUB_BROKEN_DIAGRAM = """@startuml
+title {title}
+class Пользователь {{
+  +имя : String
+@enduml"""
+
+STUB_EXPLANATION = """
+Пояснение к схеме:
+- Пользователь отправляет запрос приложению PlantGPT.
+- Приложение сохраняет полученную схему в базе данных SQLite.
+- После подтверждения записи пользователь видит превью схемы.
+Схему можно дополнить новыми участниками и сообщениями, если это потребуется.
+"""
+
+
+class LLMBackend:
+    name = "base"
+
+    def __init__(self, model=DEFAULT_LLM_MODEL, stream=True):
+        self.model = model
+        # При stream=False astream отдаёт ответ одним фрагментом через acomplete ("llm_stream": false).
+        self.stream = stream
+
+    def complete(self, messages):
+        raise NotImplementedError
+
+    async def acomplete(self, messages):
+        return await asyncio.to_thread(self.complete, messages)
+
+    async def astream(self, messages):
+        # Бэкенд без потоковой выдачи отдаёт ответ одним фрагментом.
+        yield await self.acomplete(messages)
+
+    def invalidate(self, messages):
+        # Ответ оказался непригоден (нет кода или код не отрисовался); кэширующие бэкенды его забывают.
+        pass
+
+
+class G4FBackend(LLMBackend):
+    name = "g4f"
+
+    def complete(self, messages):
+        from g4f import ChatCompletion
+        return ChatCompletion.create(model=self.model, messages=messages)
+
+    async def acomplete(self, messages):
+        from g4f import ChatCompletion
+        return await ChatCompletion.create_async(model=self.model, messages=messages)
+
+    async def astream(self, messages):
+        if not self.stream:
+            yield await self.acomplete(messages)
+            return
+        from g4f import ChatCompletion
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        stop = threading.Event()
+
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(chunks.put_nowait, item)
+            except RuntimeError:
+                pass
+
+        def produce():
+            # Синхронный генератор g4f читается в отдельном потоке; после stop
+            # поток закрывает соединение на следующем фрагменте.
+            try:
+                stream = ChatCompletion.create(model=self.model, messages=messages, stream=True)
+                try:
+                    for chunk in stream:
+                        if stop.is_set():
+                            break
+                        put((chunk, None))
+                finally:
+                    close = getattr(stream, "close", None)
+                    if close is not None:
+                        close()
+                put((None, None))
+            except Exception as e:
+                put((None, e))
+
+        threading.Thread(target=produce, daemon=True).start()
+        try:
+            while True:
+                chunk, error = await chunks.get()
+                if error is not None:
+                    raise error
+                if chunk is None:
+                    return
+                if chunk:
+                    yield str(chunk)
+        finally:
+            stop.set()
+
+
+class StubBackend(LLMBackend):
+    name = "stub"
+
+    def __init__(self, model=DEFAULT_LLM_MODEL, latency=DEFAULT_STUB_LATENCY, error_rate=0.0, token_latency=0.0,
+                 stream=True):
+        super().__init__(model, stream)
+        self.latency = max(0.0, float(latency))
+        self.error_rate = min(1.0, max(0.0, float(error_rate)))
+        self.token_latency = max(0.0, float(token_latency))
+        self._repeats = {}
+        self._lock = threading.Lock()
+
+    def _response(self, messages):
+        payload = json.dumps(messages, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        # Повторный одинаковый запрос даёт следующий детерминированный вариант,
+        # как повторная выборка у настоящей модели.
+        with self._lock:
+            repeat = self._repeats.get(payload, 0)
+            self._repeats[payload] = repeat + 1
+        digest = hashlib.sha256(payload + repeat.to_bytes(4, "big")).digest()
+        broken = int.from_bytes(digest[:4], "big") / 2 ** 32 < self.error_rate
+        prompt = next((m.get("content", "") for m in messages if m.get("role") == "user"), "")
+        title = (prompt.strip().splitlines() or ["Схема"])[0][:60].replace('"', "'")
+        template = STUB_BROKEN_DIAGRAM if broken else STUB_DIAGRAM
+        return f"Вот код схемы:\n\n```plantuml\n{template.format(title=title)}\n```\n{STUB_EXPLANATION}"
+
+    def _prefill(self, messages):
+        # Время на чтение запроса растёт с его длиной, как у настоящей модели.
+        if not self.token_latency:
+            return 0.0
+        return self.token_latency * sum(estimate_tokens(m.get("content", "")) for m in messages)
+
+    def complete(self, messages):
+        delay = self.latency + self._prefill(messages)
+        if delay:
+            time.sleep(delay)
+        return self._response(messages)
+
+    async def acomplete(self, messages):
+        delay = self.latency + self._prefill(messages)
+        if delay:
+            await asyncio.sleep(delay)
+        return self._response(messages)
+
+    async def astream(self, messages):
+        if not self.stream:
+            yield await self.acomplete(messages)
+            return
+        prefill = self._prefill(messages)
+        if prefill:
+            await asyncio.sleep(prefill)
+        response = self._response(messages)
+        chunks = [response[i:i + STUB_STREAM_CHUNK] for i in range(0, len(response), STUB_STREAM_CHUNK)]
+        # Задержка распределяется по фрагментам, как у модели, печатающей ответ.
+        delay = self.latency / len(chunks)
+        for chunk in chunks:
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk
+
+
+class ReplayBackend(LLMBackend):
+    name = "replay"
+
+    def __init__(self, cache, model=DEFAULT_LLM_MODEL, stream=True):
+        super().__init__(model, stream)
+        self.cache = cache
+
+    def _replay(self, messages, allow_partial):
+        response = self.cache.replay(self.model, messages, allow_partial)
+        if response is None:
+            raise LookupError("Ответ не найден в кэше (режим воспроизведения).")
+        return response
+
+    def complete(self, messages):
+        return self._replay(messages, False)
+
+    async def astream(self, messages):
+        # Потоковое чтение остановится на первой диаграмме, так что подходят и обрезанные ответы.
+        yield self._replay(messages, self.stream)
+
+
+class CachedBackend(LLMBackend):
+    def __init__(self, backend, cache, bypass=False):
+        super().__init__(backend.model, backend.stream)
+        self.backend = backend
+        self.cache = cache
+        self.bypass = bypass
+        self.name = backend.name
+
+    def _cached(self, messages, allow_partial=False):
+        if self.bypass:
+            return None
+        response = self.cache.get(self.model, messages, allow_partial)
+        if response is not None:
+            print("Ответ ChatGPT взят из кэша.")
+        return response
+
+    def _store(self, messages, response, started, partial=False):
+        # Ответы без кода (ошибки провайдера, отказы) не кэшируются, иначе повторный запрос вернул бы их же.
+        if extract_plantuml_code(response) is None:
+            return
+        self.cache.put(self.model, messages, response, time.perf_counter() - started, partial)
+
+    def invalidate(self, messages):
+        self.cache.invalidate(self.model, messages)
+
+    def complete(self, messages):
+        response = self._cached(messages)
+        if response is not None:
+            return response
+        started = time.perf_counter()
+        response = self.backend.complete(messages)
+        self._store(messages, response, started)
+        return response
+
+    async def acomplete(self, messages):
+        response = self._cached(messages)
+        if response is not None:
+            return response
+        started = time.perf_counter()
+        response = await self.backend.acomplete(messages)
+        self._store(messages, response, started)
+        return response
+
+    async def astream(self, messages):
+        if not self.stream:
+            yield await self.acomplete(messages)
+            return
+        response = self._cached(messages, allow_partial=True)
+        if response is not None:
+            yield response
+            return
+        started = time.perf_counter()
+        stream = self.backend.astream(messages)
+        parts = []
+        complete = partial = False
+        try:
+            async for chunk in stream:
+                parts.append(chunk)
+                yield chunk
+            complete = True
+        except GeneratorExit:
+            # Поток остановлен после @end...: полученного текста достаточно для повторного
+            # извлечения того же кода, но acomplete и воспроизведение его не получат.
+            complete = partial = bool(parts)
+            raise
+        finally:
+            await stream.aclose()
+            if complete:
+                self._store(messages, "".join(parts), started, partial)
+
+
+def create_backend(config, cache=None):
+    name = config.get("llm_backend", DEFAULT_LLM_BACKEND)
+    model = config.get("llm_model", DEFAULT_LLM_MODEL)
+    stream = bool(config.get("llm_stream", True))
+    if config.get("llm_replay_only", False):
+        name = "replay"
+    if name == "replay":
+        if cache is None:
+            raise ValueError("Для режима воспроизведения нужен кэш ответов.")
+        return ReplayBackend(cache, model, stream)
+    if name == "stub":
+        try:
+            return StubBackend(
+                model,
+                latency=config.get("stub_latency", DEFAULT_STUB_LATENCY),
+                error_rate=config.get("stub_error_rate", 0.0),
+                token_latency=config.get("stub_token_latency", 0.0),
+                stream=stream,
+            )
+        except (TypeError, ValueError):
+            return StubBackend(model, stream=stream)
+    if name != "g4f":
+        print(f"Неизвестный LLM-бэкенд '{name}', используется g4f.")
+    backend = G4FBackend(model, stream)
+    if cache is not None:
+        backend = CachedBackend(backend, cache, bypass=config.get("llm_cache_bypass", False))
+    return backend
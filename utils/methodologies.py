@@ -0,0 +1,155 @@
+import os
+import threading
+
+METHODOLOGY_EXT = ".txt"
+POLL_INTERVAL = 2.0
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class MethodologyStore:
+    def __init__(self, directory):
+        self.directory = str(directory)
+        self.version = 0
+        self._stats = {}
+        self._bodies = {}
+        self._scanned = False
+        self._lock = threading.RLock()
+        self._observer = None
+        self._stop = None
+
+    def path(self, name):
+        return os.path.join(self.directory, name + METHODOLOGY_EXT)
+
+    def _scan(self):
+        stats = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(METHODOLOGY_EXT):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    if entry.is_file():
+                        stats[entry.name[:-len(METHODOLOGY_EXT)]] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            pass
+        return stats
+
+    def refresh(self):
+        # Читаются только метаданные каталога; тексты перечитываются лениво,
+        # когда у файла поменялись время изменения или размер.
+        stats = self._scan()
+        with self._lock:
+            self._scanned = True
+            if stats == self._stats:
+                return False
+            self._stats = stats
+            for name in list(self._bodies):
+                if self._bodies[name][0] != stats.get(name):
+                    del self._bodies[name]
+            self.version += 1
+            return True
+
+    def names(self):
+        return self.snapshot()[1]
+
+    def snapshot(self):
+        # Версия вместе со списком: по ней окна узнают, что список устарел.
+        with self._lock:
+            if not self._scanned:
+                self.refresh()
+            return self.version, sorted(self._stats)
+
+    def get(self, name):
+        if not name:
+            return None
+        try:
+            st = os.stat(self.path(name))
+        except OSError:
+            return None
+        signature = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._bodies.get(name)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+        try:
+            with open(self.path(name), "r", encoding="utf-8") as f:
+                body = f.read().strip()
+        except OSError:
+            return None
+        with self._lock:
+            self._bodies[name] = (signature, body)
+        return body
+
+    def save(self, name, body):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(name), "w", encoding="utf-8") as f:
+            f.write(body)
+        self.refresh()
+
+    def delete(self, names):
+        errors = []
+        for name in names:
+            try:
+                os.remove(self.path(name))
+            except Exception as e:
+                errors.append(f"{name}{METHODOLOGY_EXT}: {e}")
+        self.refresh()
+        return errors
+
+    def start_watching(self, interval=POLL_INTERVAL):
+        if self._observer is not None or self._stop is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            self._observer = self._start_observer()
+            return
+        except ImportError:
+            print(f"Пакет watchdog не установлен, папка методологий опрашивается каждые {interval} с.")
+        except Exception as e:
+            print(f"Не удалось следить за папкой методологий, используется опрос: {e}")
+        # Без watchdog опрашиваем каталог: это только scandir и stat, без чтения файлов.
+        self._stop = threading.Event()
+        threading.Thread(target=self._poll, args=(interval,), daemon=True).start()
+
+    def _start_observer(self):
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        store = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                store.refresh()
+
+        observer = Observer()
+        observer.schedule(Handler(), self.directory, recursive=False)
+        observer.daemon = True
+        observer.start()
+        return observer
+
+    def _poll(self, interval):
+        stop = self._stop
+        while not stop.wait(interval):
+            self.refresh()
+
+    def stop_watching(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+
+
+def get_store(directory):
+    key = str(directory)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = MethodologyStore(key)
+        return store
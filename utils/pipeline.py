@@ -0,0 +1,264 @@
+import asyncio
+import re
+import time
+
+from utils.plantuml import render_plantuml, DEFAULT_OUTPUT_FORMAT
+from utils.plantuml_extract import PlantUMLExtractor, extract_all_plantuml_code
+from utils.plantuml_server import PlantUMLSyntaxError
+from utils.telemetry import span, count
+from utils.text_utils import estimate_tokens
+
+RETRY_DELAY = 1
+STREAM_EVENT_INTERVAL = 0.1
+ERROR_CONTEXT_LINES = 2
+CANDIDATE_HINT = "Предложи самостоятельный вариант решения №{number}, независимый от других вариантов."
+INVALID_FILENAME_CHARS = r'\/:*?"<>|'
+
+_STDRPT_RE = re.compile(r":(\d+):\s*error:(.*)", re.IGNORECASE)
+_ERROR_LINE_RE = re.compile(r"^Error line (\d+)", re.IGNORECASE | re.MULTILINE)
+
+
+class GenerationError(Exception):
+    pass
+
+
+def generation_limits(config):
+    try:
+        candidates = max(1, int(config.get("candidates", 1)))
+    except Exception:
+        candidates = 1
+    try:
+        deadline = float(config.get("generation_deadline", 0)) or None
+    except Exception:
+        deadline = None
+    return candidates, deadline
+
+
+def is_diagram_error(err_text):
+    return "diagram description contains errors" in err_text.lower()
+
+
+def parse_render_error(error):
+    if isinstance(error, PlantUMLSyntaxError):
+        return error.line, "; ".join(error.messages) or "синтаксическая ошибка"
+    text = str(error)
+    stdrpt = _STDRPT_RE.search(text)
+    if stdrpt:
+        return int(stdrpt.group(1)), stdrpt.group(2).strip() or "синтаксическая ошибка"
+    match = _ERROR_LINE_RE.search(text)
+    line = int(match.group(1)) if match else None
+    details = [
+        row.strip() for row in text.splitlines()
+        if row.strip() and not row.startswith("PlantUML error") and not is_diagram_error(row)
+        and not _ERROR_LINE_RE.match(row)
+    ]
+    return line, "; ".join(details) or "синтаксическая ошибка"
+
+
+def code_excerpt(plantuml_code, line, context=ERROR_CONTEXT_LINES):
+    lines = plantuml_code.split("\n")
+    if line is None or not 1 <= line <= len(lines):
+        return ""
+    first = max(1, line - context)
+    last = min(len(lines), line + context)
+    return "\n".join(
+        f"{'>>' if i == line else '  '} {i:>3} | {lines[i - 1]}" for i in range(first, last + 1)
+    )
+
+
+def build_fix_message(plantuml_code, line, message):
+    text = f"PlantUML не смог отрисовать этот код. Сообщение об ошибке: {message}"
+    excerpt = code_excerpt(plantuml_code, line)
+    if excerpt:
+        text += f"\n\nФрагмент вокруг строки {line}:\n{excerpt}"
+    return text + "\n\nИсправь ошибку и выведи полный исправленный код PlantUML целиком."
+
+
+def retry_messages(prompt, failed_code, line, message):
+    messages = [{"role": "user", "content": prompt}]
+    if failed_code is not None:
+        messages.append({"role": "assistant", "content": f"```plantuml\n{failed_code}\n```"})
+        messages.append({"role": "user", "content": build_fix_message(failed_code, line, message)})
+    return messages
+
+
+def candidate_messages(messages, index):
+    if not index:
+        return messages
+    return [{"role": "system", "content": CANDIDATE_HINT.format(number=index + 1)}] + messages
+
+
+async def _read_stream(index, attempt, messages, backend, emit, metrics):
+    extractor = PlantUMLExtractor()
+    parts = []
+    received = 0
+    stopped = False
+    last_event = 0.0
+    stream = backend.astream(messages)
+    try:
+        with span("llm", model=backend.model, attempt=attempt) as attrs:
+            async for chunk in stream:
+                parts.append(chunk)
+                received += len(chunk)
+                # Код извлекается по мере поступления: после @end... остаток
+                # ответа (пояснения модели) уже не нужен, поток закрывается.
+                if extractor.feed(chunk):
+                    stopped = attrs["stopped_early"] = True
+                    count("llm_stream_stopped")
+                    break
+                now = time.monotonic()
+                if now - last_event >= STREAM_EVENT_INTERVAL:
+                    last_event = now
+                    emit("stream", attempt=attempt, candidate=index, chars=received,
+                         code_lines=extractor.pending_lines())
+    finally:
+        await stream.aclose()
+    metrics["stopped_early"] = stopped
+    with span("extract"):
+        blocks = extractor.blocks or extractor.finish()
+    return "".join(parts), blocks
+
+
+async def _read_all(attempt, messages, backend):
+    # Нужны все диаграммы ответа, поэтому он читается целиком, без остановки на первом @end...
+    with span("llm", model=backend.model, attempt=attempt):
+        response = await backend.acomplete(messages)
+    with span("extract"):
+        return response, extract_all_plantuml_code(response)
+
+
+async def _run_candidate(index, attempt, messages, backend, jar_path, render_cache, emit, output_format,
+                         all_diagrams=False):
+    metrics = {
+        "attempt": attempt,
+        "candidate": index,
+        "prompt_tokens": sum(estimate_tokens(m["content"]) for m in messages),
+        "response_tokens": 0,
+        "llm_seconds": 0.0,
+        "render_seconds": 0.0,
+        "error_line": None,
+        "error": None,
+        "stopped_early": False,
+    }
+    outcome = {"metrics": metrics, "code": None, "image_data": None, "error": None, "extra": []}
+    started = time.perf_counter()
+    messages = candidate_messages(messages, index)
+    if all_diagrams:
+        response, blocks = await _read_all(attempt, messages, backend)
+    else:
+        response, blocks = await _read_stream(index, attempt, messages, backend, emit, metrics)
+    metrics["llm_seconds"] = time.perf_counter() - started
+    metrics["response_tokens"] = estimate_tokens(response)
+    emit("response", attempt=attempt, candidate=index)
+
+    plantuml_code = blocks[0] if blocks else None
+    if not plantuml_code:
+        backend.invalidate(messages)
+        raise GenerationError("Код PlantUML не найден в ответе.")
+    outcome["code"] = plantuml_code
+    emit("code", attempt=attempt, candidate=index, code=plantuml_code)
+
+    started = time.perf_counter()
+    try:
+        outcome["image_data"] = await asyncio.to_thread(
+            render_plantuml, plantuml_code, jar_path, render_cache, output_format
+        )
+    except RuntimeError as e:
+        if not is_diagram_error(str(e)):
+            raise
+        # Кэшированный ответ с неотрисовываемым кодом повторил бы ту же цепочку ошибок.
+        backend.invalidate(messages)
+        outcome["error"] = e
+        metrics["error_line"], metrics["error"] = parse_render_error(e)
+    else:
+        # Остальные диаграммы ответа не повторяются: не отрисовавшаяся просто пропускается.
+        for number, code in enumerate(blocks[1:] if all_diagrams else [], 2):
+            try:
+                data = await asyncio.to_thread(render_plantuml, code, jar_path, render_cache, output_format)
+            except RuntimeError as e:
+                print(f"Диаграмма №{number} из ответа не отрисована: {e}")
+                continue
+            outcome["extra"].append((code, data))
+    finally:
+        metrics["render_seconds"] = time.perf_counter() - started
+    return outcome
+
+
+async def agenerate_scheme(prompt, backend, jar_path, max_retries, render_cache=None, on_event=None,
+                           retry_delay=RETRY_DELAY, candidates=1, deadline=None, output_format=DEFAULT_OUTPUT_FORMAT,
+                           all_diagrams=False):
+    def emit(event, **info):
+        if on_event is not None:
+            on_event(event, **info)
+
+    candidates = max(1, int(candidates))
+    deadline_at = time.monotonic() + deadline if deadline else None
+    messages = retry_messages(prompt, None, None, None)
+    failed_attempts = 0
+    attempt_metrics = []
+    for attempt in range(1, max_retries + 1):
+        tasks = [
+            asyncio.create_task(_run_candidate(
+                i, attempt, messages, backend, jar_path, render_cache, emit, output_format, all_diagrams))
+            for i in range(candidates)
+        ]
+        timeout = None if deadline_at is None else max(0.0, deadline_at - time.monotonic())
+        winner = None
+        first_failure = None
+        errors = []
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=timeout):
+                try:
+                    outcome = await next_done
+                # До Python 3.11 as_completed бросает asyncio.TimeoutError, а не встроенный TimeoutError.
+                except asyncio.TimeoutError:
+                    raise GenerationError("Превышено время ожидания генерации схемы.")
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                attempt_metrics.append(outcome["metrics"])
+                if outcome["error"] is None:
+                    winner = outcome
+                    break
+                failed_attempts += 1
+                count("render_errors")
+                first_failure = first_failure or outcome
+                emit(
+                    "render_error", attempt=attempt, failed_attempts=failed_attempts,
+                    error=str(outcome["error"]), line=outcome["metrics"]["error_line"],
+                )
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if winner is not None:
+            return {
+                "code": winner["code"],
+                "image_data": winner["image_data"],
+                "image_format": output_format,
+                "extra_diagrams": winner["extra"],
+                "attempts": attempt,
+                "failed_attempts": failed_attempts,
+                "llm_seconds": sum(m["llm_seconds"] for m in attempt_metrics),
+                "render_seconds": sum(m["render_seconds"] for m in attempt_metrics),
+                "prompt_tokens": sum(m["prompt_tokens"] for m in attempt_metrics),
+                "response_tokens": sum(m["response_tokens"] for m in attempt_metrics),
+                "attempt_metrics": attempt_metrics,
+            }
+        if first_failure is None:
+            raise errors[0]
+        failed_metrics = first_failure["metrics"]
+        messages = retry_messages(prompt, first_failure["code"], failed_metrics["error_line"], failed_metrics["error"])
+        if retry_delay:
+            await asyncio.sleep(retry_delay)
+    raise GenerationError(f"Не удалось получить корректный код PlantUML за {max_retries} попыток.")
+
+
+def generate_scheme(prompt, backend, jar_path, max_retries, render_cache=None, on_event=None,
+                    retry_delay=RETRY_DELAY, candidates=1, deadline=None, output_format=DEFAULT_OUTPUT_FORMAT):
+    return asyncio.run(agenerate_scheme(
+        prompt, backend, jar_path, max_retries,
+        render_cache=render_cache, on_event=on_event, retry_delay=retry_delay,
+        candidates=candidates, deadline=deadline, output_format=output_format,
+    ))
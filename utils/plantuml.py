@@ -1,33 +1,81 @@
+import hashlib
 import os
-import re
-import subprocess
-import time
-
-def extract_plantuml_code(text):
-    code_blocks = re.findall(r"``````", text, re.DOTALL | re.IGNORECASE)
-    if code_blocks:
-        return code_blocks[0].strip()
-    matches = re.findall(r"(@startuml.*?@enduml)", text, re.DOTALL | re.IGNORECASE)
-    if matches:
-        return matches[0].strip()
-    return None
-
-def generate_plantuml_diagram(plantuml_code, output_dir, filename, jar_path):
-    temp_file = os.path.join(output_dir, f"{filename}.uml")
-    with open(temp_file, "w", encoding="utf-8") as f:
-        f.write(plantuml_code.strip())
-    time.sleep(0.1)
-    cmd = [
-        "java", "-jar", jar_path, "-charset", "UTF-8", "-stdrpt:1", temp_file
-    ]
-    result = subprocess.run(cmd, cwd=output_dir, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise RuntimeError(f"PlantUML error:\n{result.stderr.strip()}")
-    png_path = os.path.splitext(temp_file)[0] + ".png"
-    for _ in range(20):
-        if os.path.exists(png_path):
-            break
-        time.sleep(0.1)
-    if not os.path.exists(png_path):
-        raise FileNotFoundError("Файл схемы не найден после генерации.")
-    return png_path
+import threading
+
+from utils.plantuml_extract import extract_plantuml_code
+from utils.plantuml_lint import lint_plantuml, format_lint_issues, blocking_issues
+from utils.plantuml_server import get_render_server, PlantUMLSyntaxError
+from utils.telemetry import span, count
+
+OUTPUT_FORMATS = ("png", "svg")
+DEFAULT_OUTPUT_FORMAT = "png"
+
+_lint_enabled = True
+_jar_fingerprints = {}
+_jar_fingerprints_lock = threading.Lock()
+
+def normalize_plantuml_code(plantuml_code):
+    text = plantuml_code.replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.split("\n")).strip()
+
+def jar_fingerprint(jar_path):
+    st = os.stat(jar_path)
+    stamp = (os.path.abspath(jar_path), st.st_size, st.st_mtime_ns)
+    with _jar_fingerprints_lock:
+        cached = _jar_fingerprints.get(stamp[0])
+        if cached and cached[0] == stamp:
+            return cached[1]
+    digest = hashlib.sha256()
+    with open(jar_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    fingerprint = digest.hexdigest()
+    with _jar_fingerprints_lock:
+        _jar_fingerprints[stamp[0]] = (stamp, fingerprint)
+    return fingerprint
+
+def render_cache_key(plantuml_code, jar_path, output_format="png"):
+    digest = hashlib.sha256()
+    for part in (jar_fingerprint(jar_path), output_format, normalize_plantuml_code(plantuml_code)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def output_format_from_config(config):
+    output_format = str(config.get("output_format", DEFAULT_OUTPUT_FORMAT)).lower()
+    return output_format if output_format in OUTPUT_FORMATS else DEFAULT_OUTPUT_FORMAT
+
+def set_lint_enabled(enabled):
+    global _lint_enabled
+    _lint_enabled = bool(enabled)
+
+def render_plantuml(plantuml_code, jar_path, cache=None, output_format=DEFAULT_OUTPUT_FORMAT):
+    if _lint_enabled:
+        with span("lint"):
+            issues = lint_plantuml(plantuml_code)
+        errors = blocking_issues(issues)
+        if errors:
+            count("lint_rejections")
+            raise PlantUMLSyntaxError(errors[0].line, format_lint_issues(errors))
+        if issues:
+            # Предупреждения не останавливают рендер: PlantUML сам решит, корректна ли схема.
+            count("lint_warnings")
+    key = None
+    if cache is not None:
+        with span("render_cache"):
+            key = render_cache_key(plantuml_code, jar_path, output_format)
+            data = cache.get(key)
+        if data is not None:
+            count("render_cache_hits")
+            return data
+    data = get_render_server(jar_path, output_format).render(plantuml_code)
+    if cache is not None:
+        cache.put(key, data)
+    return data
+
+def generate_plantuml_diagram(plantuml_code, output_dir, filename, jar_path, output_format=DEFAULT_OUTPUT_FORMAT):
+    image_data = render_plantuml(plantuml_code, jar_path, output_format=output_format)
+    image_path = os.path.join(output_dir, f"{filename}.{output_format}")
+    with span("file_write"), open(image_path, "wb") as f:
+        f.write(image_data)
+    return image_path
@@ -0,0 +1,150 @@
+import re
+
+PLANTUML_FENCE_LANGS = {"plantuml", "puml", "uml"}
+
+_START_RE = re.compile(r"@start\w+", re.IGNORECASE)
+_END_RE = re.compile(r"@end\w+", re.IGNORECASE)
+_START_SEARCH_RE = re.compile(r"@start\w", re.IGNORECASE)
+
+# Состояния разбора
+_TEXT = 0           # обычный текст
+_FENCE = 1          # внутри ```plantuml
+_FENCE_TAIL = 2     # диаграмма из ```plantuml уже выдана, ждём закрытия блока
+_OTHER_FENCE = 3    # внутри любого другого ``` блока
+
+
+class PlantUMLExtractor:
+    def __init__(self):
+        self.blocks = []
+        self._state = _TEXT
+        self._partial = ""
+        self._lines = []
+        self._raw = None
+
+    def feed(self, chunk):
+        data = self._partial + chunk
+        lines = data.split("\n")
+        self._partial = lines.pop()
+        found = []
+        for line in lines:
+            block = self._line(line)
+            if block is not None:
+                found.append(block)
+        return found
+
+    def pending_lines(self):
+        # Сколько строк незавершённой диаграммы уже получено.
+        if self._state == _FENCE:
+            return len(self._lines)
+        if self._raw is not None:
+            return len(self._raw)
+        return 0
+
+    def idle(self):
+        return self._raw is None and self._state in (_TEXT, _OTHER_FENCE)
+
+    def finish(self):
+        found = []
+        if self._partial:
+            block = self._line(self._partial)
+            self._partial = ""
+            if block is not None:
+                found.append(block)
+        return found
+
+    def _emit(self, lines):
+        block = "\n".join(lines).strip()
+        if not block:
+            return None
+        self.blocks.append(block)
+        return block
+
+    def _line(self, line):
+        line = line.rstrip("\r")
+        state = self._state
+        if state == _FENCE:
+            if line.lstrip().startswith("```"):
+                self._state = _TEXT
+                return self._emit(self._lines)
+            self._lines.append(line)
+            # В потоке не ждём закрывающих ```: диаграмма готова на строке @end...
+            if "@" in line and _END_RE.match(line.lstrip()):
+                self._state = _FENCE_TAIL
+                return self._emit(self._lines)
+            return None
+        if state == _FENCE_TAIL:
+            if line.lstrip().startswith("```"):
+                self._state = _TEXT
+            return None
+
+        if self._raw is not None:
+            if line.lstrip().startswith("```") and state == _OTHER_FENCE:
+                # Блок кода закрылся раньше @end — диаграмма неполная.
+                self._raw = None
+                self._state = _TEXT
+                return None
+            end = _END_RE.search(line) if "@" in line else None
+            if end is None:
+                self._raw.append(line)
+                return None
+            self._raw.append(line[:end.end()])
+            lines, self._raw = self._raw, None
+            return self._emit(lines)
+
+        stripped = line.lstrip()
+        if stripped.startswith("```"):
+            if state == _OTHER_FENCE:
+                self._state = _TEXT
+            elif stripped[3:].strip().lower() in PLANTUML_FENCE_LANGS:
+                self._state = _FENCE
+                self._lines = []
+            else:
+                self._state = _OTHER_FENCE
+            return None
+        if "@" not in line:
+            return None
+        start = _START_RE.search(line)
+        if start is None:
+            return None
+        rest = line[start.start():]
+        end = _END_RE.search(rest, start.end() - start.start())
+        if end is not None:
+            return self._emit([rest[:end.end()]])
+        self._raw = [rest]
+        return None
+
+
+def iter_plantuml_blocks(text):
+    extractor = PlantUMLExtractor()
+    pos = 0
+    length = len(text)
+    while pos < length:
+        if extractor.idle():
+            # Строки без ``` и @start вне диаграммы ничего не меняют:
+            # перескакиваем их поиском до ближайшего маркера.
+            fence = text.find("```", pos)
+            start = _START_SEARCH_RE.search(text, pos, fence if fence != -1 else length)
+            if start is not None:
+                fence = start.start()
+            if fence == -1:
+                return
+            pos = text.rfind("\n", 0, fence) + 1
+        end = text.find("\n", pos)
+        if end == -1:
+            end = length
+        block = extractor._line(text[pos:end])
+        if block is not None:
+            yield block
+        pos = end + 1
+
+
+def extract_plantuml_code(text):
+    if not text:
+        return None
+    return next(iter_plantuml_blocks(text), None)
+
+
+def extract_all_plantuml_code(text):
+    if not text:
+        return []
+    return list(iter_plantuml_blocks(text))
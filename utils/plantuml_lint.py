@@ -0,0 +1,175 @@
+import re
+from collections import namedtuple
+
+# error — PlantUML точно не отрисует схему, рендер пропускается;
+# warning — вероятная ошибка структуры, но решение остаётся за PlantUML.
+LintIssue = namedtuple("LintIssue", ["line", "message", "severity"], defaults=("warning",))
+ERROR = "error"
+WARNING = "warning"
+
+DIAGRAM_TYPES = {
+    "uml", "mindmap", "wbs", "gantt", "json", "yaml", "salt", "ditaa", "dot", "math", "latex",
+    "ebnf", "regex", "chen", "files", "creole", "board", "chronology", "nwdiag", "git", "flow",
+    "wire", "def", "project",
+}
+
+_START_RE = re.compile(r"^@start(\w+)", re.IGNORECASE)
+_END_RE = re.compile(r"^@end(\w+)", re.IGNORECASE)
+_BLOCK_COMMENT_START = "/'"
+_BLOCK_COMMENT_END = "'/"
+
+# Однострочные элементы, которые без ":" превращаются в многострочный блок.
+_TEXT_BLOCKS = [
+    (re.compile(r"^[rh]?note\b(?!.*:)(?!\s*\"[^\"]*\"\s+as\b)", re.IGNORECASE), re.compile(r"^end\s?note\b", re.IGNORECASE), "note", "end note"),
+    (re.compile(r"^legend\b(?!.*:)", re.IGNORECASE), re.compile(r"^end\s?legend\b", re.IGNORECASE), "legend", "endlegend"),
+    (re.compile(r"^title$", re.IGNORECASE), re.compile(r"^end\s?title\b", re.IGNORECASE), "title", "end title"),
+    (re.compile(r"^header$", re.IGNORECASE), re.compile(r"^end\s?header\b", re.IGNORECASE), "header", "endheader"),
+    (re.compile(r"^footer$", re.IGNORECASE), re.compile(r"^end\s?footer\b", re.IGNORECASE), "footer", "endfooter"),
+]
+
+# (открывающее выражение, закрывающее выражение, имя блока, ожидаемое закрытие)
+_ACTIVITY_BLOCKS = [
+    # В старом синтаксисе activity "if" стоит после стрелки: (*) --> if "ok" then
+    (re.compile(r"^(?:.*-+>\s*(?:\[[^\]]*\]\s*)?)?if\s*[(\"]", re.IGNORECASE), re.compile(r"^end\s?if\b", re.IGNORECASE), "if", "endif"),
+    (re.compile(r"^while\s*\(", re.IGNORECASE), re.compile(r"^end\s?while\b", re.IGNORECASE), "while", "endwhile"),
+    (re.compile(r"^repeat\s*(:.*)?$", re.IGNORECASE), re.compile(r"^repeat\s+while\b", re.IGNORECASE), "repeat", "repeat while"),
+    (re.compile(r"^fork$", re.IGNORECASE), re.compile(r"^end\s?fork\b|^end\s?merge\b", re.IGNORECASE), "fork", "end fork"),
+    (re.compile(r"^split$", re.IGNORECASE), re.compile(r"^end\s?split\b", re.IGNORECASE), "split", "end split"),
+    (re.compile(r"^switch\s*\(", re.IGNORECASE), re.compile(r"^end\s?switch\b", re.IGNORECASE), "switch", "endswitch"),
+    (re.compile(r"^box\b(?!.*\{\s*$)", re.IGNORECASE), re.compile(r"^end\s?box\b", re.IGNORECASE), "box", "end box"),
+]
+# Строка-сообщение (Loop -> B: hi) — не начало группы, даже если участник назван как ключевое слово.
+_GROUP_START = re.compile(r"^(?:(alt|opt|loop|par|par2|critical|group)\b|break\s+\S)(?!.*(-+>|<-+))", re.IGNORECASE)
+_GROUP_END = re.compile(r"^end(\s?group)?$", re.IGNORECASE)
+# "{" в конце стрелки или подписи после ":" — это текст (POST /api {), а не начало блока.
+_QUOTED_RE = re.compile(r'"[^"]*"')
+_ARROW_RE = re.compile(r"[-.](?:\[[^\]]*\])?[-.]*[|*o#x/\\]?>|<[|*o#x/\\]?[-.]")
+_LABEL_RE = re.compile(r"(?<!:):(?!:)")
+
+
+def _strip_comment(line):
+    stripped = line.strip()
+    if stripped.startswith("'"):
+        return ""
+    return stripped
+
+
+def _opens_brace(text):
+    if not text.endswith("{"):
+        return False
+    text = _QUOTED_RE.sub('""', text)
+    return not _ARROW_RE.search(text) and not _LABEL_RE.search(text)
+
+
+def lint_plantuml(plantuml_code):
+    issues = []
+    lines = plantuml_code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+
+    start_line = None
+    start_type = None
+    end_line = None
+    for i, raw in enumerate(lines, 1):
+        text = raw.strip()
+        start = _START_RE.match(text)
+        if start and start_line is None:
+            start_line, start_type = i, start.group(1).lower()
+            if start_type not in DIAGRAM_TYPES:
+                issues.append(LintIssue(i, f"неизвестный тип диаграммы '@start{start.group(1)}'"))
+            continue
+        end = _END_RE.match(text)
+        if end and start_line is not None:
+            end_line = i
+            if end.group(1).lower() != start_type:
+                issues.append(LintIssue(i, f"'@end{end.group(1)}' не соответствует '@start{start_type}' в строке {start_line}"))
+            break
+    if start_line is None:
+        return [LintIssue(1, "нет строки @startuml", ERROR)]
+    if end_line is None:
+        issues.append(LintIssue(len(lines), f"нет строки @end{start_type} (блок начат в строке {start_line})", ERROR))
+        end_line = len(lines) + 1
+    if start_type != "uml":
+        return issues
+
+    stack = []
+    text_block = None
+    in_comment = False
+    for i in range(start_line + 1, end_line):
+        raw = lines[i - 1]
+        if in_comment:
+            if _BLOCK_COMMENT_END in raw:
+                in_comment = False
+            continue
+        text = _strip_comment(raw)
+        if text.startswith(_BLOCK_COMMENT_START):
+            if _BLOCK_COMMENT_END not in text[2:]:
+                in_comment = True
+            continue
+        if not text:
+            continue
+        if text.startswith("```"):
+            issues.append(LintIssue(i, "лишняя разметка Markdown '```' внутри диаграммы"))
+            continue
+
+        if text_block is not None:
+            if text_block[1].match(text):
+                text_block = None
+            continue
+        for opener, closer, name, expected in _TEXT_BLOCKS:
+            if opener.match(text):
+                text_block = (i, closer, name, expected)
+                break
+        if text_block is not None:
+            continue
+
+        if text.startswith("}"):
+            if stack and stack[-1][1] == "{":
+                stack.pop()
+            else:
+                issues.append(LintIssue(i, "лишняя закрывающая скобка '}'", ERROR))
+            text = text[1:].strip()
+        if _opens_brace(text):
+            stack.append((i, "{", "}"))
+            continue
+
+        closed = False
+        for opener, closer, name, expected in _ACTIVITY_BLOCKS:
+            if closer.match(text):
+                if stack and stack[-1][1] == name:
+                    stack.pop()
+                else:
+                    issues.append(LintIssue(i, f"'{text.split()[0]}' без открывающего '{name}'"))
+                closed = True
+                break
+        if closed:
+            continue
+        if _GROUP_END.match(text):
+            # Без открытой группы "end" — это конечный узел activity-диаграммы.
+            if stack and stack[-1][1] == "group":
+                stack.pop()
+            continue
+        for opener, closer, name, expected in _ACTIVITY_BLOCKS:
+            if opener.match(text):
+                stack.append((i, name, expected))
+                break
+        else:
+            if _GROUP_START.match(text):
+                stack.append((i, "group", "end"))
+
+    if text_block is not None:
+        issues.append(LintIssue(text_block[0], f"блок '{text_block[2]}' не закрыт ('{text_block[3]}')"))
+    if in_comment:
+        issues.append(LintIssue(end_line, "не закрыт многострочный комментарий /' ... '/"))
+    for line_no, name, expected in reversed(stack):
+        if name == "{":
+            issues.append(LintIssue(line_no, "блок '{' не закрыт (нет '}')", ERROR))
+        else:
+            issues.append(LintIssue(line_no, f"блок '{name}' не закрыт (нет '{expected}')"))
+    return sorted(issues, key=lambda issue: issue.line)
+
+
+def blocking_issues(issues):
+    return [issue for issue in issues if issue.severity == ERROR]
+
+
+def format_lint_issues(issues):
+    return [f"Строка {issue.line}: {issue.message}" for issue in issues]
@@ -0,0 +1,278 @@
+import atexit
+import os
+import queue
+import re
+import subprocess
+import threading
+import time
+import uuid
+
+from utils.telemetry import span, count
+
+DEFAULT_RENDER_WORKERS = 2
+RENDER_TIMEOUT = 60
+PNG_END = b"IEND\xaeB`\x82"
+# Конец изображения в потоке -pipe: после него PlantUML пишет отчёт -stdrpt.
+IMAGE_ENDS = {"png": PNG_END, "svg": b"</svg>"}
+
+_START_RE = re.compile(r"^\s*@start\w*", re.IGNORECASE)
+_END_RE = re.compile(r"^\s*@end\w*", re.IGNORECASE)
+
+
+class RenderEngineCrashed(RuntimeError):
+    pass
+
+
+class PlantUMLSyntaxError(RuntimeError):
+    def __init__(self, line, messages):
+        self.line = line
+        self.messages = list(messages)
+        super().__init__(format_render_error(line, self.messages))
+
+
+def first_diagram_lines(plantuml_code):
+    # PlantUML в режиме -pipe читает stdin до первой строки @end...,
+    # всё, что идёт после, попало бы в следующий рендер.
+    lines = []
+    started = False
+    for line in plantuml_code.strip().splitlines():
+        if not started:
+            if _START_RE.match(line):
+                started = True
+            else:
+                continue
+        lines.append(line)
+        if _END_RE.match(line):
+            return lines
+    return None
+
+
+def format_render_error(line, messages):
+    text = "PlantUML error:\n"
+    if line is not None:
+        text += f"Error line {line}\n"
+    if messages:
+        text += "\n".join(messages) + "\n"
+    return text + "Some diagram description contains errors"
+
+
+class _PipeEngine:
+    def __init__(self, jar_path, output_format="png"):
+        self.jar_path = jar_path
+        self.image_end = IMAGE_ENDS[output_format]
+        self.delimiter = f"PLANTGPT-{uuid.uuid4().hex}"
+        self.renders = 0
+        self._chunks = queue.Queue()
+        self._stderr_lines = []
+        cmd = [
+            "java", "-Djava.awt.headless=true", "-jar", jar_path,
+            "-charset", "UTF-8", "-stdrpt:1", f"-t{output_format}",
+            "-pipe", "-pipeNoStderr", "-pipedelimitor", self.delimiter,
+        ]
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+        )
+        threading.Thread(target=self._read_stdout, daemon=True).start()
+        threading.Thread(target=self._read_stderr, daemon=True).start()
+
+    def _read_stdout(self):
+        fd = self.proc.stdout.fileno()
+        while True:
+            try:
+                chunk = os.read(fd, 65536)
+            except OSError:
+                chunk = b""
+            if not chunk:
+                self._chunks.put(None)
+                return
+            self._chunks.put(chunk)
+
+    def _read_stderr(self):
+        for raw in iter(self.proc.stderr.readline, b""):
+            self._stderr_lines.append(raw.decode("utf-8", errors="replace").rstrip())
+            del self._stderr_lines[:-50]
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def render(self, lines, timeout):
+        self.renders += 1
+        stderr_mark = len(self._stderr_lines)
+        payload = ("\n".join(lines) + "\n").encode("utf-8")
+        try:
+            self.proc.stdin.write(payload)
+            self.proc.stdin.flush()
+        except OSError as e:
+            raise RenderEngineCrashed(f"PlantUML процесс недоступен: {e}")
+
+        marker = self.delimiter.encode("ascii")
+        buf = bytearray()
+        deadline = time.monotonic() + timeout
+        while True:
+            idx = buf.find(marker)
+            if idx != -1 and buf.find(b"\n", idx) != -1:
+                output = bytes(buf[:idx])
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("PlantUML не ответил за отведённое время")
+            try:
+                chunk = self._chunks.get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError("PlantUML не ответил за отведённое время")
+            if chunk is None:
+                stderr = "\n".join(self._stderr_lines[stderr_mark:])
+                raise RenderEngineCrashed(f"PlantUML процесс завершился:\n{stderr}")
+            buf.extend(chunk)
+
+        # Ищем с конца: отчёт -stdrpt — текст, а внутри SVG бывают вложенные <svg> (спрайты, картинки).
+        end = output.rfind(self.image_end)
+        if end == -1:
+            image, trailer = b"", output
+        else:
+            end += len(self.image_end)
+            image, trailer = output[:end], output[end:]
+        report = trailer.decode("utf-8", errors="replace").strip().splitlines()
+        report += self._stderr_lines[stderr_mark:]
+        if report and report[0].strip() == "ERROR":
+            line = None
+            if len(report) > 1 and report[1].strip().isdigit():
+                line = int(report[1].strip())
+            raise PlantUMLSyntaxError(line, [r for r in report[2:] if r.strip()])
+        if not image:
+            raise RuntimeError("PlantUML error:\nПустой ответ от PlantUML")
+        return image
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+class PlantUMLServer:
+    def __init__(self, jar_path, max_workers=DEFAULT_RENDER_WORKERS, timeout=RENDER_TIMEOUT, output_format="png"):
+        self.jar_path = jar_path
+        self.jar_stamp = _jar_stamp(jar_path)
+        self.output_format = output_format
+        self.max_workers = max(1, int(max_workers))
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._engines = []
+        self._closed = False
+
+    def _acquire_engine(self):
+        while True:
+            try:
+                engine = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if engine.alive():
+                return engine
+            self._discard(engine)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Сервер PlantUML остановлен")
+            engine = _PipeEngine(self.jar_path, self.output_format)
+            self._engines.append(engine)
+            count("jvm_starts")
+            return engine
+
+    def _discard(self, engine):
+        with self._lock:
+            if engine in self._engines:
+                self._engines.remove(engine)
+        engine.close()
+
+    def render(self, plantuml_code):
+        lines = first_diagram_lines(plantuml_code)
+        if lines is None:
+            raise PlantUMLSyntaxError(None, ["Не найдена пара @startuml/@enduml"])
+        with self._slots:
+            for attempt in range(2):
+                engine = self._acquire_engine()
+                # Первый рендер нового процесса включает запуск JVM: считаем его отдельно.
+                stage = "render" if engine.renders else "render_cold"
+                try:
+                    with span(stage):
+                        data = engine.render(lines, self.timeout)
+                except RenderEngineCrashed:
+                    count("jvm_crashes")
+                    self._discard(engine)
+                    if attempt == 1:
+                        raise
+                    continue
+                except TimeoutError as e:
+                    self._discard(engine)
+                    raise RuntimeError(f"PlantUML error:\n{e}")
+                except RuntimeError:
+                    self._idle.put(engine)
+                    raise
+                self._idle.put(engine)
+                return data
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            engines = list(self._engines)
+            self._engines.clear()
+        for engine in engines:
+            engine.close()
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+_render_workers = DEFAULT_RENDER_WORKERS
+
+
+def set_render_workers(count):
+    global _render_workers
+    try:
+        _render_workers = max(1, int(count))
+    except (TypeError, ValueError):
+        _render_workers = DEFAULT_RENDER_WORKERS
+
+
+def _jar_stamp(jar_path):
+    try:
+        st = os.stat(jar_path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def get_render_server(jar_path, output_format="png"):
+    # Формат задаётся при запуске JVM (-tpng/-tsvg), поэтому у каждого формата свои процессы.
+    key = (os.path.abspath(jar_path), output_format)
+    # Jar, заменённый по тому же пути, требует новых JVM: прогретые процессы отрисуют старой версией.
+    stamp = _jar_stamp(key[0])
+    with _servers_lock:
+        server = _servers.get(key)
+        if server is None or server.max_workers != _render_workers or server.jar_stamp != stamp:
+            if server is not None:
+                threading.Thread(target=server.close, daemon=True).start()
+            server = PlantUMLServer(key[0], _render_workers, output_format=output_format)
+            _servers[key] = server
+        return server
+
+
+def shutdown_render_servers():
+    with _servers_lock:
+        servers = list(_servers.values())
+        _servers.clear()
+    for server in servers:
+        server.close()
+
+
+atexit.register(shutdown_render_servers)
@@ -0,0 +1,194 @@
+import re
+
+from utils.text_utils import estimate_tokens
+
+IMPROVE_PROMPT_HEADER = "Придумай схему, а затем сгенерируй код для PlantUML, чтобы он нарисовал схему, придуманную тобой. Далее подробное описание темы.\n\n"
+IMPROVE_PROMPT_FOOTER = "\n\nПерепроверь код, сделай его ПОЛНОСТЬЮ корректным, чтобы PlantUML сгенерировал хорошую схему."
+METHODOLOGY_PREFIX = "\n\nИспользуй следующую методологию для рисования схемы:\n"
+
+# 0 — без ограничения: промт собирается как раньше, пока бюджет не задан в настройках.
+DEFAULT_PROMPT_TOKEN_BUDGET = 0
+DEDUPE_MIN_CHARS = 12
+TRUNCATION_MARK = "…"
+# Разделы методологии с этими словами важнее остальных и отбрасываются последними.
+PRIORITY_KEYWORDS = ("важно", "обязательно", "всегда", "никогда", "правил", "must", "required", "important")
+
+_HEADING_RE = re.compile(r"^\s*(#{1,6}\s|\d+[.)]\s|[^\s].{0,80}:\s*$)")
+_NORMALIZE_RE = re.compile(r"[\W_]+")
+
+
+def prompt_token_budget(config):
+    try:
+        return max(0, int(config.get("prompt_token_budget", DEFAULT_PROMPT_TOKEN_BUDGET)))
+    except Exception:
+        return DEFAULT_PROMPT_TOKEN_BUDGET
+
+
+def normalize_instruction(line):
+    return _NORMALIZE_RE.sub(" ", line.lower()).strip()
+
+
+def split_sections(text):
+    # Раздел начинается с заголовка (#, "1.", "Название:") или после пустой строки.
+    sections = []
+    current = []
+    for line in text.splitlines():
+        if not line.strip() or (_HEADING_RE.match(line) and current):
+            if current:
+                sections.append("\n".join(current))
+                current = []
+            if not line.strip():
+                continue
+        current.append(line)
+    if current:
+        sections.append("\n".join(current))
+    return sections
+
+
+def section_priority(section, index):
+    # 0 — первый раздел (суть методологии), 1 — разделы с ключевыми словами, дальше по порядку.
+    if index == 0:
+        return 0
+    lowered = section.lower()
+    if any(word in lowered for word in PRIORITY_KEYWORDS):
+        return 1
+    return 2
+
+
+class PromptBuild:
+    def __init__(self, text, budget):
+        self.text = text
+        self.budget = budget
+        self.tokens = estimate_tokens(text)
+        self.original_tokens = self.tokens
+        self.deduplicated = 0
+        self.dropped_sections = 0
+        self.truncated = False
+
+    @property
+    def over_budget(self):
+        return bool(self.budget) and self.tokens > self.budget
+
+    @property
+    def compacted(self):
+        return bool(self.deduplicated or self.dropped_sections or self.truncated)
+
+    def notice(self):
+        parts = []
+        if self.deduplicated:
+            parts.append(f"повторов убрано: {self.deduplicated}")
+        if self.dropped_sections:
+            parts.append(f"разделов методологии отброшено: {self.dropped_sections}")
+        if self.truncated:
+            parts.append("методология обрезана")
+        return f"Промт сокращён под бюджет {self.budget} токенов ({', '.join(parts)})."
+
+
+class _Part:
+    def __init__(self, text, priority=None, order=0):
+        self.text = text
+        self.priority = priority
+        self.order = order
+
+
+def _dedupe(parts, build):
+    # Повторы инструкций (например, "перепроверь код" и в методологии, и в улучшениях)
+    # отправляем один раз: строка убирается из более поздних сокращаемых частей.
+    seen = set()
+    for part in parts:
+        if part.priority is None:
+            seen.update(normalize_instruction(line) for line in part.text.splitlines())
+            continue
+        kept = []
+        for line in part.text.splitlines():
+            key = normalize_instruction(line)
+            if len(key) >= DEDUPE_MIN_CHARS and key in seen:
+                build.deduplicated += 1
+                continue
+            seen.add(key)
+            kept.append(line)
+        part.text = "\n".join(kept).strip()
+
+
+def _render(prompt, methodology_parts, improve_parts, improve):
+    methodology = "\n\n".join(part.text for part in methodology_parts if part.text)
+    improve_texts = [part.text for part in improve_parts if part.text]
+    if improve:
+        text = IMPROVE_PROMPT_HEADER + prompt
+        if methodology:
+            text += f"{METHODOLOGY_PREFIX}{methodology}"
+        for extra in improve_texts:
+            text += f"\n\n{extra}"
+        return text + IMPROVE_PROMPT_FOOTER
+    if methodology:
+        return prompt + f"{METHODOLOGY_PREFIX}{methodology}"
+    return prompt
+
+
+def _truncate(part, excess_tokens):
+    # Оставляем целые предложения с начала части, пока не уложимся в бюджет.
+    keep_bytes = max(0, len(part.text.encode("utf-8")) - excess_tokens * 4 - len(TRUNCATION_MARK.encode("utf-8")) - 4)
+    text = part.text.encode("utf-8")[:keep_bytes].decode("utf-8", "ignore")
+    cut = max(text.rfind(". "), text.rfind("\n"))
+    if cut > len(text) // 2:
+        text = text[:cut + 1]
+    part.text = text.rstrip() + TRUNCATION_MARK if text.strip() else ""
+
+
+def assemble_prompt(prompt, methodology_prompt, config):
+    prompt = prompt.strip()
+    budget = prompt_token_budget(config)
+    improve = config.get("improve_prompt", False)
+    methodology_parts = [
+        _Part(section, section_priority(section, i), i)
+        for i, section in enumerate(split_sections(methodology_prompt or ""))
+    ]
+    improve_parts = []
+    if improve:
+        for i, key in enumerate(("prompt_improve_1", "prompt_improve_2")):
+            extra = config.get(key, "").strip()
+            if extra:
+                improve_parts.append(_Part(extra, 1, len(methodology_parts) + i))
+
+    original = _render(prompt, methodology_parts, improve_parts, improve)
+    build = PromptBuild(original, budget)
+    if not build.over_budget:
+        # В бюджет укладываемся: текст совпадает с прежней сборкой, ключи кэша ответов не меняются.
+        return build
+    fixed = [_Part(prompt)]
+    if improve:
+        fixed += [_Part(IMPROVE_PROMPT_HEADER), _Part(IMPROVE_PROMPT_FOOTER)]
+    _dedupe(fixed + methodology_parts + improve_parts, build)
+    text = _render(prompt, methodology_parts, improve_parts, improve)
+    tokens = estimate_tokens(text)
+
+    if tokens > budget:
+        # Сначала отбрасываем целые разделы от наименее важных и поздних к первым.
+        trimmable = sorted(
+            (part for part in methodology_parts + improve_parts if part.text and part.priority > 0),
+            key=lambda part: (part.priority, part.order), reverse=True,
+        )
+        size = len(text.encode("utf-8"))
+        for part in trimmable:
+            if (size + 3) // 4 <= budget:
+                break
+            # Размер считаем вычитанием (часть плюс разделитель), чтобы не пересобирать текст на каждом шаге.
+            size -= len(part.text.encode("utf-8")) + 2
+            part.text = ""
+            build.dropped_sections += 1
+        text = _render(prompt, methodology_parts, improve_parts, improve)
+        tokens = estimate_tokens(text)
+        # Не хватило — укорачиваем первый раздел методологии; запрос пользователя не трогаем.
+        while tokens > budget and methodology_parts and methodology_parts[0].text:
+            _truncate(methodology_parts[0], tokens - budget)
+            build.truncated = True
+            text = _render(prompt, methodology_parts, improve_parts, improve)
+            tokens = estimate_tokens(text)
+
+    build.text = text
+    build.tokens = tokens
+    return build
+
+
+def build_prompt(prompt, methodology_prompt, config):
+    return assemble_prompt(prompt, methodology_prompt, config).text
@@ -0,0 +1,99 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+STARTUP_BUDGET_MS = 1500
+PROFILE_TOP = 20
+PROBE_FLAG = "--startup-probe"
+PROBE_PREFIX = "STARTUP "
+FIRST_FRAME = "первый кадр"
+# Эти пакеты должны загружаться только при первом использовании.
+DEFERRED_MODULES = ("PIL", "g4f")
+
+_started = time.perf_counter()
+_phases = []
+_loaded_at_first_frame = []
+
+
+def mark(phase):
+    _phases.append((phase, round((time.perf_counter() - _started) * 1000, 1)))
+
+
+def first_frame():
+    mark(FIRST_FRAME)
+    _loaded_at_first_frame[:] = [m for m in DEFERRED_MODULES if m in sys.modules]
+
+
+def report_probe():
+    # Дочерний процесс профилирования сообщает этапы одной строкой в stdout.
+    probe = {"phases": dict(_phases), "deferred_loaded": _loaded_at_first_frame}
+    print(PROBE_PREFIX + json.dumps(probe, ensure_ascii=False), flush=True)
+
+
+def parse_importtime(stderr):
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue
+        name = parts[2][1:]
+        level = (len(name) - len(name.lstrip(" "))) // 2
+        modules.append((name.strip(), level, self_us, cumulative_us))
+    return modules
+
+
+def run_probe(extra_args=(), importtime=False):
+    main_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += [main_path, PROBE_FLAG, *extra_args]
+    started = time.perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8", errors="replace")
+    wall_ms = (time.perf_counter() - started) * 1000
+    probe = None
+    for line in proc.stdout.splitlines():
+        if line.startswith(PROBE_PREFIX):
+            probe = json.loads(line[len(PROBE_PREFIX):])
+    if probe is None:
+        tail = "\n".join(proc.stderr.strip().splitlines()[-5:])
+        raise RuntimeError(f"Приложение не сообщило о первом кадре (код {proc.returncode}):\n{tail}")
+    return probe, wall_ms, proc.stderr
+
+
+def profile_startup(top=PROFILE_TOP):
+    try:
+        probe, wall_ms, stderr = run_probe(importtime=True)
+    except RuntimeError as e:
+        print(e)
+        return 1
+    modules = parse_importtime(stderr)
+
+    print("Этапы запуска (мс от запуска main.py):")
+    for phase, ms in probe["phases"].items():
+        print(f"  {phase:<32}{ms:>10.1f}")
+    print(f"  {'процесс целиком':<32}{wall_ms:>10.1f}")
+    if probe["deferred_loaded"]:
+        print(f"  До первого кадра загружены: {', '.join(probe['deferred_loaded'])}")
+
+    # Как в -X importtime: self — время самого модуля, cumulative — вместе с его импортами.
+    print(f"\nСамые дорогие импорты верхнего уровня (первые {top}):")
+    print(f"  {'модуль':<40}{'self, мс':>12}{'всего, мс':>12}")
+    top_level = sorted((m for m in modules if m[1] == 0), key=lambda m: m[3], reverse=True)
+    for name, _, self_us, cumulative_us in top_level[:top]:
+        print(f"  {name:<40}{self_us / 1000:>12.1f}{cumulative_us / 1000:>12.1f}")
+    total = sum(m[3] for m in modules if m[1] == 0) / 1000
+    print(f"  {'всего на импорты':<40}{'':>12}{total:>12.1f}")
+
+    print(f"\nСамые медленные модули по собственному времени (первые {top}):")
+    for name, _, self_us, _ in sorted(modules, key=lambda m: m[2], reverse=True)[:top]:
+        print(f"  {name:<40}{self_us / 1000:>12.1f}")
+    return 0
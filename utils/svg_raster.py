@@ -0,0 +1,112 @@
+import queue
+import re
+import threading
+from io import BytesIO
+
+from utils.telemetry import span
+
+RASTERIZER_UNAVAILABLE = "Растеризатор SVG недоступен: установите пакет cairosvg"
+
+_SVG_TAG_RE = re.compile(rb"<svg\b[^>]*>", re.IGNORECASE)
+_ATTR_RE = re.compile(rb"""\b(width|height|viewBox)\s*=\s*["']([^"']*)["']""")
+_NUMBER_RE = re.compile(r"[-+]?\d*\.?\d+")
+
+_available = None
+
+
+def rasterizer_available():
+    # cairosvg может установиться без системной библиотеки cairo — тогда импорт падает с OSError.
+    global _available
+    if _available is None:
+        try:
+            import cairosvg  # noqa: F401
+            _available = True
+        except (ImportError, OSError):
+            _available = False
+    return _available
+
+
+def svg_size(svg_data):
+    # PlantUML пишет width/height в px и viewBox; берём то, что есть.
+    tag = _SVG_TAG_RE.search(svg_data[:4096])
+    if tag is None:
+        return None
+    attrs = {name.decode(): value.decode("ascii", "replace") for name, value in _ATTR_RE.findall(tag.group(0))}
+    try:
+        width = float(_NUMBER_RE.match(attrs["width"].strip()).group(0))
+        height = float(_NUMBER_RE.match(attrs["height"].strip()).group(0))
+    except (KeyError, AttributeError, ValueError):
+        numbers = [float(n) for n in _NUMBER_RE.findall(attrs.get("viewBox", ""))]
+        if len(numbers) != 4:
+            return None
+        width, height = numbers[2], numbers[3]
+    if width <= 0 or height <= 0:
+        return None
+    return width, height
+
+
+def fit_size(width, height, max_width, max_height):
+    scale = min(max_width / width, max_height / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _cairosvg():
+    if not rasterizer_available():
+        raise RuntimeError(RASTERIZER_UNAVAILABLE)
+    import cairosvg
+    return cairosvg
+
+
+def rasterize_svg(svg_data, max_width, max_height):
+    # Вектор растеризуется сразу в размер области превью, без промежуточного полноразмерного растра.
+    cairosvg = _cairosvg()
+
+    size = svg_size(svg_data)
+    if size is None:
+        return cairosvg.svg2png(bytestring=svg_data)
+    width, height = fit_size(size[0], size[1], max_width, max_height)
+    return cairosvg.svg2png(bytestring=svg_data, output_width=width, output_height=height)
+
+
+def svg_to_png(svg_data):
+    return _cairosvg().svg2png(bytestring=svg_data)
+
+
+class SvgRasterizer:
+    def __init__(self, db):
+        self.db = db
+        self.results = queue.Queue()
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def request(self, image_id, width, height):
+        key = (image_id, width, height)
+        with self._lock:
+            if key in self._pending:
+                return key
+            self._pending.add(key)
+        self._queue.put(key)
+        return key
+
+    def _rasterize(self, image_id, width, height):
+        from PIL import Image
+
+        img = Image.open(BytesIO(rasterize_svg(self.db.read_image(image_id), width, height)))
+        img.load()
+        return img
+
+    def _run(self):
+        while True:
+            key = self._queue.get()
+            try:
+                with span("svg_raster"):
+                    img = self._rasterize(*key)
+                self.results.put((key, img, None))
+            except Exception as e:
+                print(f"Не удалось растеризовать SVG для изображения {key[0]}: {e}")
+                self.results.put((key, None, e))
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
@@ -0,0 +1,154 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+FLUSH_SIZE = 100
+FLUSH_INTERVAL = 5.0
+SUMMARY_LIMIT = 10000
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class Telemetry:
+    def __init__(self):
+        self.db = None
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def attach(self, db):
+        self.db = db
+
+    def detach(self):
+        self.flush(wait=True)
+        self.db = None
+
+    @contextmanager
+    def span(self, stage, **attrs):
+        started = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException:
+            attrs["error"] = True
+            raise
+        finally:
+            self._record("span", stage, time.perf_counter() - started, attrs)
+
+    def count(self, name, value=1, **attrs):
+        self._record("counter", name, value, attrs)
+
+    def _record(self, kind, name, value, attrs):
+        if self.db is None:
+            return
+        row = (time.time(), kind, name, value, json.dumps(attrs, ensure_ascii=False) if attrs else None)
+        with self._lock:
+            self._buffer.append(row)
+            due = len(self._buffer) >= FLUSH_SIZE or time.monotonic() - self._last_flush >= FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self, wait=False):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+        if not rows or self.db is None:
+            return
+        # Метрики пишутся пачкой через общую очередь записи и не задерживают генерацию.
+        try:
+            future = self.db.submit(lambda conn: conn.executemany(
+                'INSERT INTO metrics (ts, kind, name, value, attrs) VALUES (?, ?, ?, ?, ?)', rows
+            ))
+            if wait:
+                future.result()
+        except Exception as e:
+            print(f"Не удалось сохранить метрики: {e}")
+
+
+telemetry = Telemetry()
+
+
+def span(stage, **attrs):
+    return telemetry.span(stage, **attrs)
+
+
+def count(name, value=1, **attrs):
+    telemetry.count(name, value, **attrs)
+
+
+def summarize(db, since=None):
+    telemetry.flush(wait=True)
+    conn = db.read()
+    where = "WHERE kind=?"
+    params = ["span"]
+    if since is not None:
+        where += " AND ts >= ?"
+        params.append(since)
+    durations = {}
+    rows = conn.execute(f'SELECT name, value FROM metrics {where} ORDER BY ts DESC LIMIT ?', params + [SUMMARY_LIMIT])
+    for name, value in rows:
+        durations.setdefault(name, []).append(value * 1000)
+    stages = {
+        name: {
+            "count": len(values),
+            "mean_ms": round(sum(values) / len(values), 2),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "max_ms": round(max(values), 2),
+        }
+        for name, values in sorted(durations.items())
+    }
+    params[0] = "counter"
+    counters = {
+        name: total
+        for name, total in conn.execute(f'SELECT name, SUM(value) FROM metrics {where} GROUP BY name ORDER BY name', params)
+    }
+
+    scheme_where = "WHERE attempts IS NOT NULL"
+    scheme_params = []
+    if since is not None:
+        scheme_where += " AND created_at >= ?"
+        scheme_params.append(since)
+    retries = {
+        attempts: schemes
+        for attempts, schemes in conn.execute(
+            f'SELECT attempts, COUNT(*) FROM schemes {scheme_where} GROUP BY attempts ORDER BY attempts', scheme_params
+        )
+    }
+    methodologies = [
+        {
+            "methodology": methodology or "—",
+            "schemes": schemes,
+            "mean_attempts": round(mean_attempts, 2),
+            "mean_seconds": round(mean_seconds or 0.0, 2),
+        }
+        for methodology, schemes, mean_attempts, mean_seconds in conn.execute(f'''
+            SELECT methodology, COUNT(*), AVG(attempts), AVG(duration) FROM schemes {scheme_where}
+            GROUP BY methodology ORDER BY AVG(attempts) DESC
+        ''', scheme_params)
+    ]
+    return {
+        "stages": stages,
+        "counters": counters,
+        "retry_histogram": retries,
+        "methodologies": methodologies,
+    }
+
+
+def export_json(db, path, since=None):
+    summary = summarize(db, since)
+    summary["exported_at"] = time.time()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=4)
+    return summary
+
+
+def clear_metrics(db):
+    telemetry.flush(wait=True)
+    db.write(lambda conn: conn.execute('DELETE FROM metrics'))
@@ -9,3 +9,9 @@ def bind_ctrl_v(textbox):
     textbox.bind("<Control-v>", paste_event)
     textbox.bind("<Control-V>", paste_event)
     textbox.bind("<Shift-Insert>", paste_event)
+
+def estimate_tokens(text):
+    # Грубая офлайн-оценка: ~4 байта UTF-8 на токен для BPE-токенизаторов.
+    if not text:
+        return 0
+    return (len(text.encode("utf-8")) + 3) // 4
@@ -0,0 +1,71 @@
+import queue
+import threading
+from io import BytesIO
+
+THUMBNAIL_SIZES = (320, 640, 1280)
+
+
+def make_thumbnails(image_data, sizes=THUMBNAIL_SIZES):
+    from PIL import Image
+
+    img = Image.open(BytesIO(image_data))
+    img.load()
+    if img.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+        img = img.convert("RGBA")
+    thumbs = []
+    # Строим пирамиду сверху вниз: каждый уровень уменьшается из предыдущего.
+    for size in sorted(sizes, reverse=True):
+        full = max(img.size) <= size
+        if not full:
+            img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        buf = BytesIO()
+        img.save(buf, format="PNG")
+        thumbs.append((size, img.width, img.height, full, buf.getvalue()))
+    thumbs.reverse()
+    return thumbs
+
+
+def pick_thumbnail(thumbs, width, height):
+    # thumbs: [(size, w, h, full)] по возрастанию size; выбираем наименьшую,
+    # которая не меньше области превью, иначе полноразмерную копию.
+    for size, w, h, full in thumbs:
+        if full or w >= width or h >= height:
+            return size
+    return None
+
+
+class ThumbnailBuilder:
+    def __init__(self, db, on_ready=None):
+        self.db = db
+        self.on_ready = on_ready
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def enqueue(self, image_id):
+        if image_id is None:
+            return
+        with self._lock:
+            if image_id in self._pending:
+                return
+            self._pending.add(image_id)
+        self._queue.put(image_id)
+
+    def enqueue_missing(self):
+        for image_id in self.db.images_without_thumbnails():
+            self.enqueue(image_id)
+
+    def _run(self):
+        while True:
+            image_id = self._queue.get()
+            try:
+                image_data = self.db.read_image(image_id)
+                self.db.add_thumbnails(image_id, make_thumbnails(image_data))
+                if self.on_ready is not None:
+                    self.on_ready(image_id)
+            except Exception as e:
+                print(f"Не удалось построить миниатюры для изображения {image_id}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(image_id)
@@ -0,0 +1,130 @@
+import queue
+import threading
+from io import BytesIO
+
+from utils.svg_raster import svg_to_png
+from utils.telemetry import span
+
+TILE_SIZE = 256
+
+
+def tile_levels(width, height, tile_size=TILE_SIZE):
+    # Уровень 0 — полный размер, каждый следующий вдвое меньше; последний помещается в один тайл.
+    levels = 1
+    while max(width, height) > tile_size:
+        width, height = (width + 1) // 2, (height + 1) // 2
+        levels += 1
+    return levels
+
+
+def level_size(width, height, level):
+    scale = 1 << level
+    return (width + scale - 1) // scale, (height + scale - 1) // scale
+
+
+def make_tiles(image_data, tile_size=TILE_SIZE):
+    # Отдаёт уровни по одному, чтобы закодированные тайлы не копились в памяти.
+    from PIL import Image
+
+    img = Image.open(BytesIO(image_data))
+    img.load()
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        img = img.convert("RGBA")
+    width, height = img.size
+    for level in range(tile_levels(width, height, tile_size)):
+        if level:
+            img = img.resize(level_size(width, height, level), Image.Resampling.BOX)
+        tiles = []
+        for row in range((img.height + tile_size - 1) // tile_size):
+            for col in range((img.width + tile_size - 1) // tile_size):
+                x, y = col * tile_size, row * tile_size
+                buf = BytesIO()
+                img.crop((x, y, min(x + tile_size, img.width), min(y + tile_size, img.height))).save(buf, format="PNG")
+                tiles.append((col, row, buf.getvalue()))
+        yield level, tiles
+
+
+class TileLoader:
+    def __init__(self, db):
+        self.db = db
+        self.results = queue.Queue()
+        # Ключи тайлов, видимых сейчас; запросы, ушедшие за край окна, пропускаются.
+        self.wanted = frozenset()
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def prepare(self, image_id):
+        self._queue.put(("prepare", image_id))
+
+    def request(self, key):
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._queue.put(("tile", key))
+
+    def close(self):
+        self._queue.put(None)
+
+    def _build(self, image_id):
+        # Полное изображение декодируется один раз при построении пирамиды, дальше читаются только тайлы.
+        image_data = self.db.read_image(image_id)
+        if self.db.image_format(image_id) == "svg":
+            image_data = svg_to_png(image_data)
+        from PIL import Image
+
+        with Image.open(BytesIO(image_data)) as img:
+            width, height = img.size
+        for level, tiles in make_tiles(image_data):
+            self.db.add_tiles(image_id, level, tiles)
+        self.db.set_tile_set(image_id, TILE_SIZE, width, height, tile_levels(width, height))
+
+    def _prepare(self, image_id):
+        tile_set = self.db.get_tile_set(image_id)
+        if tile_set is None:
+            with span("tiles_build"):
+                self._build(image_id)
+            tile_set = self.db.get_tile_set(image_id)
+        return tile_set
+
+    def _load(self, key):
+        from PIL import Image
+
+        image_id, level, col, row, width, height = key
+        data = self.db.get_tile(image_id, level, col, row)
+        if data is None:
+            return None
+        img = Image.open(BytesIO(data))
+        img.load()
+        if img.size != (width, height):
+            resample = Image.Resampling.LANCZOS if width < img.width else Image.Resampling.BILINEAR
+            img = img.resize((width, height), resample)
+        return img
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            if job[0] == "prepare":
+                _, image_id = job
+                try:
+                    self.results.put(("ready", image_id, self._prepare(image_id)))
+                except Exception as e:
+                    print(f"Не удалось подготовить тайлы для изображения {image_id}: {e}")
+                    self.results.put(("error", image_id, e))
+                continue
+            key = job[1]
+            try:
+                if key in self.wanted:
+                    with span("tile_decode"):
+                        img = self._load(key)
+                    if img is not None:
+                        self.results.put(("tile", key, img))
+            except Exception as e:
+                print(f"Не удалось загрузить тайл {key}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)